@@ -0,0 +1,175 @@
+import os
+import mmap
+import zlib
+from array import array
+from datetime import datetime
+from typing import Dict, Optional
+from fchat_logs import ChatLogs, Character, Message, SenderTable, DAY_MS, LOCAL_TZ, LOCAL_OFFSETS
+
+# NumPy is optional, only the bulk decoder needs it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HAS_NUMPY = np is not None
+
+RECORD_DTYPE = None if np is None else np.dtype([
+    ('offset', '<i8'),
+    ('size', '<i4'),
+    ('timestamp', '<u4'),
+    ('type', 'u1'),
+    ('name_len', 'u1'),
+    ('text_len', '<u2'),
+])
+
+class BulkLog:
+    """All records of a log file decoded at once into a NumPy structured array
+
+    Record boundaries are found in a single forward pass, all other fields are
+    gathered from the mapped bytes with vectorized operations. Names and texts
+    are only decoded on access. Use as a context manager or call close().
+    """
+    def __init__(self, file_path: str):
+        if np is None:
+            raise ImportError("NumPy is required for bulk decoding")
+        self.file_path = file_path
+        self.mapped = None
+        self.data = np.zeros(0, dtype=np.uint8)
+        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+            with open(file_path, 'rb') as f:
+                self.mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.data = np.frombuffer(self.mapped, dtype=np.uint8)
+        self.records = self._decode(self._find_boundaries())
+
+    def __enter__(self) -> "BulkLog":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.data = None
+        if self.mapped is not None:
+            try:
+                self.mapped.close()
+            except BufferError:
+                # arrays handed out still reference the mapping, it is closed once they are gone
+                pass
+            self.mapped = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _find_boundaries(self) -> "np.ndarray":
+        """Walk the size fields of all records, raises ValueError for a cut off record"""
+        buffer = self.mapped
+        size = len(self.data)
+        offsets = array('q')
+        pos = 0
+        while pos < size:
+            if pos + 8 > size or pos + 8 + buffer[pos + 5] > size:
+                raise ValueError(f"Incomplete message at offset {pos} of file {self.file_path}")
+            name_end = pos + 6 + buffer[pos + 5]
+            offsets.append(pos)
+            pos = name_end + 4 + (buffer[name_end] | buffer[name_end + 1] << 8)
+        if pos > size:
+            raise ValueError(f"Incomplete message at offset {offsets[-1]} of file {self.file_path}")
+        return np.frombuffer(offsets, dtype=np.int64)
+
+    def _decode(self, offsets: "np.ndarray") -> "np.ndarray":
+        """Gather the fixed fields of all records and check their size markers"""
+        data = self.data
+        records = np.zeros(len(offsets), dtype=RECORD_DTYPE)
+        if len(offsets) == 0:
+            return records
+        records['offset'] = offsets
+        records['timestamp'] = (data[offsets].astype(np.uint32)
+                                | data[offsets + 1].astype(np.uint32) << 8
+                                | data[offsets + 2].astype(np.uint32) << 16
+                                | data[offsets + 3].astype(np.uint32) << 24)
+        records['type'] = data[offsets + 4]
+        name_len = data[offsets + 5].astype(np.int64)
+        records['name_len'] = name_len
+        text_len = data[offsets + 6 + name_len].astype(np.int64) | data[offsets + 7 + name_len].astype(np.int64) << 8
+        records['text_len'] = text_len
+        sizes = name_len + text_len + 10
+        records['size'] = sizes
+
+        markers = data[offsets + sizes - 2].astype(np.int64) | data[offsets + sizes - 1].astype(np.int64) << 8
+        invalid = np.flatnonzero(markers != sizes - 2)
+        if len(invalid) > 0:
+            raise ValueError(f"Invalid message size marker at offset {offsets[invalid[0]]} of file {self.file_path}")
+        return records
+
+    def name_bytes(self, position: int) -> bytes:
+        offset = int(self.records['offset'][position])
+        return self.mapped[offset + 6:offset + 6 + int(self.records['name_len'][position])]
+
+    def text_bytes(self, position: int) -> bytes:
+        record = self.records[position]
+        start = int(record['offset']) + 8 + int(record['name_len'])
+        return self.mapped[start:start + int(record['text_len'])]
+
+    def message(self, position: int, sender_table: Optional[SenderTable] = None) -> Message:
+        """Decode a single record, same result as ChatLogs.deserialize_message"""
+        name_bytes = self.name_bytes(position)
+        return Message(
+            time=datetime.fromtimestamp(int(self.records['timestamp'][position]), LOCAL_TZ),
+            type=int(self.records['type'][position]),
+            sender=Character(name=str(name_bytes, 'utf-8')) if sender_table is None else sender_table.get(name_bytes),
+            text=str(self.text_bytes(position), 'utf-8')
+        )
+
+    def day_numbers(self) -> "np.ndarray":
+        """Index day number of every record, same result as ChatLogs.get_day_of_timestamp"""
+        timestamps = self.records['timestamp'].astype(np.int64)
+        utc_days, inverse = np.unique(timestamps // 86400, return_inverse=True)
+        day_offsets = np.zeros(len(utc_days), dtype=np.int64)
+        transition_days = np.zeros(len(utc_days), dtype=bool)
+        for position, day in enumerate(utc_days.tolist()):
+            day_offsets[position] = LOCAL_OFFSETS.offset(day * 86400)
+            transition_days[position] = LOCAL_OFFSETS.is_transition_day(day)
+        offsets = day_offsets[inverse]
+
+        # days with a timezone transition are resolved record by record
+        for position in np.flatnonzero(transition_days[inverse]).tolist():
+            offsets[position] = LOCAL_OFFSETS.offset(int(timestamps[position]))
+        return (timestamps * 1000 / DAY_MS - offsets / 60 / 1440).astype(np.int64)
+
+    def day_counts(self) -> Dict[int, int]:
+        """Number of records per index day"""
+        days, counts = np.unique(self.day_numbers(), return_counts=True)
+        return dict(zip(days.tolist(), counts.tolist()))
+
+    def dedup_keys(self) -> "np.ndarray":
+        """Key of every record for duplicate detection: timestamp, size and crc32 of the record bytes"""
+        keys = np.zeros(len(self), dtype=[('timestamp', '<u4'), ('size', '<i4'), ('crc', '<u4')])
+        keys['timestamp'] = self.records['timestamp']
+        keys['size'] = self.records['size']
+        mapped = self.mapped
+        keys['crc'] = [
+            zlib.crc32(mapped[offset:offset + size])
+            for offset, size in zip(self.records['offset'].tolist(), self.records['size'].tolist())
+        ]
+        return keys
+
+    def verify(self, chat_logs: ChatLogs) -> None:
+        """Compare every record with the pure Python decoder, raises ValueError on the first difference"""
+        offset = 0
+        days = self.day_numbers().tolist()
+        for position, (record_offset, size, timestamp, _, _, _) in enumerate(self.records.tolist()):
+            if record_offset != offset:
+                raise ValueError(f"Record {position} starts at {record_offset} instead of {offset}")
+            expected, expected_size = chat_logs.deserialize_message(self.mapped, offset)
+            if size != expected_size or self.message(position) != expected:
+                raise ValueError(f"Record {position} at offset {offset} differs from deserialize_message")
+            if days[position] != chat_logs.get_day_of_timestamp(timestamp):
+                raise ValueError(f"Day number of record {position} at offset {offset} differs")
+            offset += size
+        if offset != len(self.data):
+            raise ValueError(f"Records end at {offset} instead of {len(self.data)}")
+
+def decode_log(chat_logs: ChatLogs, character: str, conversation_key: str) -> BulkLog:
+    """Decode all records of a conversation log in bulk"""
+    return BulkLog(chat_logs.get_log_file(character, conversation_key))
@@ -1,16 +1,24 @@
 import tkinter as tk
 from tkinter import ttk
 import ttkbootstrap as ttk
-from fchat_logs import ChatLogs
-from typing import List
+from fchat_logs import ChatLogs, Message
+from log_watcher import LogWatcher, LogChange
+from typing import List, Sequence
+from collections import deque
 from datetime import datetime
 from dateutil.tz import tzlocal 
 import argparse
 
 LOCAL_TZ = tzlocal()
 
+# messages per page and number of pages kept in the continuous history mode
+PAGE_SIZE = 200
+MAX_PAGES = 5
+# how often the log is checked for new messages
+WATCH_INTERVAL_MS = 1000
+
 class ChatViewer(ttk.Window):
-    def __init__(self, database_path: str, character: str, conversation: str):
+    def __init__(self, database_path: str, character: str, conversation: str, history: bool = False):
         super().__init__(themename="darkly")
         
         self.title(f"F-Chat Viewer - {character}/{conversation}")
@@ -21,8 +29,27 @@ class ChatViewer(ttk.Window):
         self.character = character
         self.conversation = conversation
         
+        # (start offset, end offset, line count) of the pages shown in history mode
+        self.pages = deque()
+        self.has_later = False
+        self.loading = False
+        
         self._create_ui()
+        self.history_var.set(history)
         self._load_dates()
+        if history:
+            self._on_mode_changed()
+        
+        # follow messages that F-Chat appends while the viewer is open
+        self.watcher = LogWatcher()
+        self.watcher.watch(character, [self.chat_logs], keys=[conversation])
+        self.watcher.start()
+        self.after(WATCH_INTERVAL_MS, self._poll_watcher)
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        
+    def _on_close(self):
+        self.watcher.stop()
+        self.destroy()
         
     def _create_ui(self):
         """Create the main UI components"""
@@ -39,6 +66,15 @@ class ChatViewer(ttk.Window):
         self.date_combo.pack(side=tk.LEFT, padx=5)
         self.date_combo.bind("<<ComboboxSelected>>", self._on_date_selected)
         
+        # Continuous history instead of single dates
+        self.history_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            date_frame,
+            text="Continuous History",
+            variable=self.history_var,
+            command=self._on_mode_changed
+        ).pack(side=tk.LEFT, padx=10)
+        
         # Chat display area
         chat_frame = ttk.Frame(main_container)
         chat_frame.pack(fill=tk.BOTH, expand=True)
@@ -52,8 +88,8 @@ class ChatViewer(ttk.Window):
             fg="#ffffff",
             insertbackground="#ffffff"
         )
-        scrollbar = ttk.Scrollbar(chat_frame, orient=tk.VERTICAL, command=self.chat_text.yview)
-        self.chat_text.configure(yscrollcommand=scrollbar.set)
+        self.scrollbar = ttk.Scrollbar(chat_frame, orient=tk.VERTICAL, command=self.chat_text.yview)
+        self.chat_text.configure(yscrollcommand=self._on_chat_scroll)
         
         # Configure tags for different message types
         self.chat_text.tag_configure("timestamp", foreground="#888888")
@@ -63,7 +99,7 @@ class ChatViewer(ttk.Window):
         
         # Pack text widget and scrollbar
         self.chat_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         # Make text widget read-only
         self.chat_text.configure(state=tk.DISABLED)
@@ -81,6 +117,8 @@ class ChatViewer(ttk.Window):
             
     def _on_date_selected(self, event):
         """Handle date selection"""
+        if self.history_var.get():
+            return
         try:
             selected_date = datetime.strptime(
                 self.date_combo.get(), 
@@ -93,33 +131,177 @@ class ChatViewer(ttk.Window):
             self.chat_text.delete(1.0, tk.END)
             
             # Display messages
-            for msg in messages:
-                # Format timestamp
-                timestamp = msg.time.strftime("%H:%M:%S")
-                self.chat_text.insert(tk.END, f"[{timestamp}] ", "timestamp")
-                
-                # Handle different message types
-                if msg.type == 0:  # System/Event message
-                    self.chat_text.insert(tk.END, f"{msg.text}\n", "system")
-                else:
-                    self.chat_text.insert(tk.END, f"{msg.sender.name}: ", "sender")
-                    self.chat_text.insert(tk.END, f"{msg.text}\n", "message")
+            self._insert_messages(tk.END, messages)
                     
             self.chat_text.configure(state=tk.DISABLED)
             self.chat_text.see(tk.END)
             
         except Exception as e:
             print(f"Error displaying messages: {e}")
+            
+    def _insert_messages(self, index: str, messages: Sequence[Message]) -> int:
+        """Insert formatted messages at index and return the number of added lines"""
+        chunks = []
+        for msg in messages:
+            # Format timestamp
+            timestamp = msg.time.strftime("%H:%M:%S")
+            chunks += [f"[{timestamp}] ", "timestamp"]
+            
+            # Handle different message types
+            if msg.type == 0:  # System/Event message
+                chunks += [f"{msg.text}\n", "system"]
+            else:
+                chunks += [f"{msg.sender.name}: ", "sender", f"{msg.text}\n", "message"]
+                
+        if not chunks:
+            return 0
+        lines_before = self._line_count()
+        self.chat_text.insert(index, *chunks)
+        return self._line_count() - lines_before
+        
+    def _line_count(self) -> int:
+        return int(self.chat_text.index("end-1c").split(".")[0])
+        
+    def _on_mode_changed(self):
+        """Switch between single dates and the continuous history"""
+        if self.history_var.get():
+            self.date_combo.configure(state="disabled")
+            self._load_history()
+        else:
+            self.date_combo.configure(state="readonly")
+            self._on_date_selected(None)
+            
+    def _load_history(self):
+        """Show the newest page of the conversation"""
+        try:
+            page = self.chat_logs.read_page(self.character, self.conversation, count=PAGE_SIZE)
+        except Exception as e:
+            print(f"Error displaying messages: {e}")
+            return
+        
+        self.pages.clear()
+        self.has_later = False
+        self.chat_text.configure(state=tk.NORMAL)
+        self.chat_text.delete(1.0, tk.END)
+        lines = self._insert_messages(tk.END, page.messages)
+        self.pages.append((page.start, page.end, lines))
+        self.chat_text.configure(state=tk.DISABLED)
+        self.chat_text.see(tk.END)
+        
+    def _on_chat_scroll(self, first, last):
+        """Load more pages when the history is scrolled to one of its ends"""
+        self.scrollbar.set(first, last)
+        if not self.history_var.get() or not self.pages or self.loading:
+            return
+        if float(first) <= 0.0 and self.pages[0][0] > 0:
+            self.loading = True
+            self.after_idle(self._load_earlier)
+        elif float(last) >= 1.0 and self.has_later:
+            self.loading = True
+            self.after_idle(self._load_later)
+            
+    def _load_earlier(self):
+        """Prepend the page in front of the first shown message"""
+        try:
+            page = self.chat_logs.read_page(self.character, self.conversation, cursor=self.pages[0][0], count=PAGE_SIZE)
+            self.chat_text.configure(state=tk.NORMAL)
+            lines = self._insert_messages("1.0", page.messages)
+            self.pages.appendleft((page.start, page.end, lines))
+            # keep the previously first line at the top of the view
+            self.chat_text.yview(f"{lines + 1}.0")
+            
+            # drop the newest page to keep memory bounded
+            if len(self.pages) > MAX_PAGES:
+                _, _, dropped = self.pages.pop()
+                last_line = self._line_count()
+                self.chat_text.delete(f"{last_line - dropped}.0", f"{last_line}.0")
+                self.has_later = True
+            self.chat_text.configure(state=tk.DISABLED)
+        except Exception as e:
+            print(f"Error displaying messages: {e}")
+        finally:
+            self.loading = False
+            
+    def _load_later(self):
+        """Append the page after the last shown message"""
+        try:
+            page = self.chat_logs.read_page(self.character, self.conversation, cursor=self.pages[-1][1], count=PAGE_SIZE, before=False)
+            self.has_later = len(page.messages) == PAGE_SIZE
+            if not page.messages:
+                return
+            self.chat_text.configure(state=tk.NORMAL)
+            lines = self._insert_messages(tk.END, page.messages)
+            self.pages.append((page.start, page.end, lines))
+            
+            # drop the oldest page to keep memory bounded
+            if len(self.pages) > MAX_PAGES:
+                _, _, dropped = self.pages.popleft()
+                top_line = int(self.chat_text.index("@0,0").split(".")[0])
+                self.chat_text.delete("1.0", f"{dropped + 1}.0")
+                self.chat_text.yview(f"{max(1, top_line - dropped)}.0")
+            self.chat_text.configure(state=tk.DISABLED)
+        except Exception as e:
+            print(f"Error displaying messages: {e}")
+        finally:
+            self.loading = False
+
+    def _poll_watcher(self):
+        """Show messages that were written to the log since the last check"""
+        changes = self.watcher.poll()
+        if changes:
+            try:
+                self._on_log_changed(changes[-1])
+            except Exception as e:
+                print(f"Error displaying messages: {e}")
+        self.after(WATCH_INTERVAL_MS, self._poll_watcher)
+        
+    def _on_log_changed(self, change: LogChange):
+        """Append new messages if the newest ones are shown, otherwise only update the dates"""
+        at_bottom = float(self.chat_text.yview()[1]) >= 1.0
+        if self.history_var.get():
+            if not change.appended:
+                self._load_history()
+                return
+            if self.has_later or self.loading or not self.pages:
+                # the new messages are loaded when scrolling down to them
+                return
+            start, end, lines = self.pages[-1]
+            page = self.chat_logs.read_page(self.character, self.conversation, cursor=end, count=PAGE_SIZE, before=False)
+            self.has_later = len(page.messages) == PAGE_SIZE
+            if not page.messages:
+                return
+            self.chat_text.configure(state=tk.NORMAL)
+            added = self._insert_messages(tk.END, page.messages)
+            self.pages[-1] = (start, page.end, lines + added)
+            self.chat_text.configure(state=tk.DISABLED)
+        else:
+            previous = list(self.date_combo["values"])
+            selected = self.date_combo.get()
+            dates: List[datetime] = self.chat_logs.get_log_dates(self.character, self.conversation)
+            self.date_combo["values"] = [d.strftime("%Y-%m-%d") for d in sorted(dates)]
+            if not self.date_combo["values"] or (previous and selected != previous[-1]):
+                return
+            # follow the newest day, keeping the scroll position if it is still the same day
+            newest = self.date_combo["values"][-1]
+            first = self.chat_text.yview()[0]
+            self.date_combo.set(newest)
+            self._on_date_selected(None)
+            if not at_bottom and newest == selected:
+                self.chat_text.yview_moveto(first)
+            return
+        if at_bottom:
+            self.chat_text.see(tk.END)
 
 def main():
     parser = argparse.ArgumentParser(description="F-Chat Viewer")
     parser.add_argument("--database", required=True, help="Path to the database directory")
     parser.add_argument("--character", required=True, help="Character name")
     parser.add_argument("--conversation", required=True, help="Conversation key")
+    parser.add_argument("--history", action="store_true", help="Start with the continuous history instead of a single date")
     
     args = parser.parse_args()
     
-    app = ChatViewer(args.database, args.character, args.conversation)
+    app = ChatViewer(args.database, args.character, args.conversation, args.history)
     app.mainloop()
 
 if __name__ == "__main__":
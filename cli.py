@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import fnmatch
+import argparse
+import contextlib
+from datetime import datetime
+from typing import List
+from data_merge import DataMerger, MergeConfig, MergeResult
+from fchat_logs import ChatLogs, RepairResult
+from summary_cache import SummaryCache
+from conversation_scanner import ConversationStatus, union_conversations
+from search_index import SearchHit, SearchIndex
+from raw_search import search_logs
+
+def _emit(event: str, **values) -> None:
+    """Write one JSON progress line to stdout, diagnostics of the commands go to stderr"""
+    print(json.dumps({"event": event, **values}), file=sys.__stdout__, flush=True)
+
+def _matches(value: str, patterns: List[str]) -> bool:
+    return any(fnmatch.fnmatch(value.lower(), pattern.lower()) for pattern in patterns)
+
+def collect_merge_configs(device_a_path: str, device_b_path: str, accounts: List[str], conversations: List[str],
+                          target: str, only_different: bool = False, incremental: bool = False) -> List[MergeConfig]:
+    """Build merge configs for all conversations matching the account and conversation patterns"""
+    db_a = ChatLogs(device_a_path)
+    db_b = ChatLogs(device_b_path)
+    summary_cache = SummaryCache(os.path.expanduser("~/.fchat_merger/summary_cache.json")) if only_different else None
+
+    configs = []
+    for account in sorted(set(db_a.get_available_characters()) | set(db_b.get_available_characters())):
+        if not _matches(account, accounts):
+            continue
+        for key, name in union_conversations(db_a.get_conversations(account), db_b.get_conversations(account)):
+            if not (_matches(key, conversations) or _matches(name, conversations)):
+                continue
+            if summary_cache is not None:
+                status = ConversationStatus(
+                    key, name,
+                    summary_cache.get(db_a, account, key),
+                    summary_cache.get(db_b, account, key)
+                )
+                if not status.different:
+                    continue
+            configs.append(MergeConfig(
+                account=account,
+                conversation=[key, name],
+                device_a_path=device_a_path,
+                device_b_path=device_b_path,
+                target=target,
+                incremental=incremental
+            ))
+    if summary_cache is not None:
+        summary_cache.save()
+    return configs
+
+def merge_command(args: argparse.Namespace) -> int:
+    configs = collect_merge_configs(
+        args.device_a, args.device_b,
+        args.account or ["*"], args.conversation or ["*"],
+        args.target, args.only_different, args.incremental
+    )
+    _emit("start", conversations=len(configs), target=args.target, jobs=args.jobs)
+
+    def _progress(result: MergeResult, done: int, total: int) -> None:
+        _emit(
+            "conversation",
+            account=result.config.account,
+            conversation=result.config.conversation[0],
+            messages=result.messages,
+            duration=round(result.duration, 3),
+            error=result.error,
+            done=done,
+            total=total
+        )
+
+    report = DataMerger().merge_conversations(configs, max_workers=args.jobs, progress=_progress)
+    _emit(
+        "done",
+        merged=len(report.results) - len(report.failed),
+        failed=len(report.failed),
+        messages=report.messages,
+        duration=round(report.duration, 3),
+        throughput=round(report.throughput, 1)
+    )
+    return 1 if report.failed else 0
+
+def _parse_date(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d").astimezone()
+
+def _search_index(args: argparse.Namespace) -> List[SearchHit]:
+    """Bring the search index up to date and query it"""
+    index = SearchIndex(args.path)
+    try:
+        indexed = index.update([args.account] if args.account else None)
+        _emit("indexed", messages=indexed)
+        return index.search(
+            args.query, account=args.account, sender=args.sender,
+            date_from=args.date_from, date_to=args.date_to, limit=args.limit
+        )
+    finally:
+        index.close()
+
+def search_command(args: argparse.Namespace) -> int:
+    if args.raw or args.regex:
+        hits = search_logs(
+            args.path, args.query, regex=args.regex, ignore_case=not args.case_sensitive,
+            accounts=[args.account] if args.account else None, limit=args.limit, max_workers=args.jobs
+        ).hits
+    else:
+        hits = _search_index(args)
+    for hit in hits:
+        _emit(
+            "hit",
+            account=hit.account,
+            conversation=hit.conversation[0],
+            offset=hit.offset,
+            time=hit.message.time.isoformat(),
+            sender=hit.message.sender.name,
+            text=hit.message.text
+        )
+    _emit("done", hits=len(hits))
+    return 0
+
+def fix_command(args: argparse.Namespace) -> int:
+    db = ChatLogs(args.path)
+    characters = [character for character in sorted(db.get_available_characters()) if _matches(character, args.account or ["*"])]
+    _emit("start", accounts=len(characters), jobs=args.jobs)
+
+    failed = 0
+    for character in characters:
+        def _progress(result: RepairResult, done: int, total: int) -> None:
+            _emit(
+                "log",
+                account=character,
+                conversation=result.key,
+                messages=result.records,
+                removed_bytes=result.file_size - result.valid_size,
+                removed_ranges=result.removed,
+                index_rewritten=result.index_rewritten,
+                damage=result.damage,
+                error=result.error,
+                done=done,
+                total=total
+            )
+
+        report = db.fix_logs(character, max_workers=args.jobs, progress=_progress, verbose=False,
+                             salvage=args.salvage, quarantine_dir=args.quarantine)
+        failed += len(report.failed)
+        _emit(
+            "account",
+            account=character,
+            logs=len(report.results),
+            repaired=len(report.repaired),
+            failed=len(report.failed),
+            removed_indices=report.removed,
+            duration=round(report.duration, 3)
+        )
+    _emit("done", accounts=len(characters), failed=failed)
+    return 1 if failed else 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="F-Chat Log Merger (headless)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    merge_parser = commands.add_parser("merge", help="Merge conversations between two data folders")
+    merge_parser.add_argument('-A', '--device-a', required=True, help='Data-Folder of Database A')
+    merge_parser.add_argument('-B', '--device-b', required=True, help='Data-Folder of Database B')
+    merge_parser.add_argument('-a', '--account', action='append', help='Account name or glob, can be repeated (default: all)')
+    merge_parser.add_argument('-c', '--conversation', action='append', help='Conversation key, name or glob, can be repeated (default: all)')
+    merge_parser.add_argument('-t', '--target', choices=["both", "device_a", "device_b"], default="both", help='Database(s) to write the merged logs to')
+    merge_parser.add_argument('-j', '--jobs', type=int, default=None, help='Number of parallel merge processes (default: number of CPUs)')
+    merge_parser.add_argument('--only-different', action='store_true', help='Skip conversations that are identical on both databases')
+    merge_parser.add_argument('--incremental', action='store_true', help='Only append missing messages if one log is a prefix of the other')
+    merge_parser.set_defaults(handler=merge_command)
+
+    search_parser = commands.add_parser("search", help="Search the messages of a data folder")
+    search_parser.add_argument('query', help='Words to search for, wrap in double quotes for an exact phrase')
+    search_parser.add_argument('-p', '--path', required=True, help='Data-Folder to search')
+    search_parser.add_argument('-a', '--account', help='Only search the conversations of this account')
+    search_parser.add_argument('-s', '--sender', help='Only show messages of this sender (index search only)')
+    search_parser.add_argument('--from', dest='date_from', type=_parse_date, help='First day to search (YYYY-MM-DD, index search only)')
+    search_parser.add_argument('--to', dest='date_to', type=_parse_date, help='Last day to search (YYYY-MM-DD, index search only)')
+    search_parser.add_argument('-n', '--limit', type=int, default=100, help='Maximum number of results')
+    search_parser.add_argument('--raw', action='store_true', help='Scan the log files for the query as a substring instead of using the index')
+    search_parser.add_argument('--regex', action='store_true', help='Scan the log files for the query as a regular expression (implies --raw)')
+    search_parser.add_argument('--case-sensitive', action='store_true', help='Match case when scanning the log files')
+    search_parser.add_argument('-j', '--jobs', type=int, default=None, help='Number of parallel scan processes (default: number of CPUs)')
+    search_parser.set_defaults(handler=search_command)
+
+    fix_parser = commands.add_parser("fix", help="Repair corrupted logs and rebuild their indices")
+    fix_parser.add_argument('-p', '--path', required=True, help='Data-Folder to repair')
+    fix_parser.add_argument('-a', '--account', action='append', help='Account name or glob, can be repeated (default: all)')
+    fix_parser.add_argument('-j', '--jobs', type=int, default=None, help='Number of parallel repair processes (default: number of CPUs)')
+    fix_parser.add_argument('--salvage', action='store_true', help='Keep the messages behind damaged bytes instead of cutting the log there')
+    fix_parser.add_argument('--quarantine', help='Folder to keep the removed bytes in (default: quarantine/<timestamp> with --salvage)')
+    fix_parser.set_defaults(handler=fix_command)
+
+    args = parser.parse_args()
+    # keep stdout for the JSON lines, the library prints its messages
+    with contextlib.redirect_stdout(sys.stderr):
+        return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from fchat_logs import ChatLogs
+from summary_cache import ConversationSummary, SummaryCache
+
+def union_conversations(conversations_a: List[Tuple[str, str]], conversations_b: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Combine the conversations of both devices into one (key, name) per key, sorted by key
+
+    The devices may store different display names for the same log, the name on
+    device A is used then.
+    """
+    names = dict(conversations_b)
+    names.update(conversations_a)
+    return sorted(names.items())
+
+@dataclass
+class ConversationStatus:
+    """Scan result of one conversation on both devices"""
+    key: str
+    name: str
+    summary_a: Optional[ConversationSummary]
+    summary_b: Optional[ConversationSummary]
+
+    @property
+    def count_a(self) -> int:
+        return 0 if self.summary_a is None else self.summary_a.count
+
+    @property
+    def count_b(self) -> int:
+        return 0 if self.summary_b is None else self.summary_b.count
+
+    @property
+    def different(self) -> bool:
+        """Whether the log contents differ, compared by their fingerprints"""
+        if self.count_a == 0 or self.count_b == 0:
+            return self.count_a != self.count_b
+        return (self.summary_a.scanned_size != self.summary_b.scanned_size
+                or self.summary_a.fingerprint != self.summary_b.fingerprint)
+
+class ScanJob:
+    """Handle of a running scan, results are collected with poll()"""
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.results: "queue.Queue[ConversationStatus]" = queue.Queue()
+        self.futures: List[Future] = []
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self.cancelled or self.done >= self.total
+
+    def cancel(self) -> None:
+        """Stop the scan, conversations that are already being scanned still finish"""
+        self._cancelled.set()
+        for future in self.futures:
+            future.cancel()
+
+    def poll(self) -> List[ConversationStatus]:
+        """Get all results that arrived since the last call"""
+        results = []
+        while True:
+            try:
+                results.append(self.results.get_nowait())
+            except queue.Empty:
+                break
+        self.done += len(results)
+        return [] if self.cancelled else results
+
+class ConversationScanner:
+    """Computes conversation summaries of both devices on a thread pool"""
+    def __init__(self, summary_cache: SummaryCache, max_workers: Optional[int] = None):
+        self.summary_cache = summary_cache
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scan")
+
+    def start(self, db_a: ChatLogs, db_b: ChatLogs, account: str, conversations: List[Tuple[str, str]]) -> ScanJob:
+        """Queue all conversations for scanning and return immediately"""
+        job = ScanJob(len(conversations))
+        for key, name in conversations:
+            job.futures.append(self.executor.submit(self._scan, job, db_a, db_b, account, key, name))
+        return job
+
+    def _scan(self, job: ScanJob, db_a: ChatLogs, db_b: ChatLogs, account: str, key: str, name: str) -> None:
+        summary_a = summary_b = None
+        try:
+            if not job.cancelled:
+                summary_a = self.summary_cache.get(db_a, account, key)
+            if not job.cancelled:
+                summary_b = self.summary_cache.get(db_b, account, key)
+        except Exception as e:
+            print(f"Error scanning {account}/{key}: {e}")
+        # always report back so the progress adds up
+        job.results.put(ConversationStatus(key, name, summary_a, summary_b))
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
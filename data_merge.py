@@ -1,9 +1,12 @@
 import os
+import mmap
+import time
 import shutil
-from dataclasses import dataclass
+import tempfile
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Tuple
-from fchat_logs import ChatLogs, Message
+from typing import Callable, Iterator, List, Optional, Tuple
+from fchat_logs import ChatLogs, LogRecord, map_processes
 
 @dataclass
 class MergeConfig:
@@ -13,13 +16,81 @@ class MergeConfig:
     device_a_path: str
     device_b_path: str
     target: str  # "both", "device_a", or "device_b"
+    incremental: bool = False  # only append the missing tail if one log is a prefix of the other
+
+@dataclass
+class MergeResult:
+    """Outcome of merging a single conversation"""
+    config: MergeConfig
+    messages: int = 0        # messages written
+    duration: float = 0.0    # seconds
+    error: Optional[str] = None
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+@dataclass
+class BatchMergeReport:
+    """Aggregated outcome of a batch merge"""
+    results: List[MergeResult] = field(default_factory=list)
+    duration: float = 0.0    # wall clock seconds of the whole batch
+
+    @property
+    def failed(self) -> List[MergeResult]:
+        return [result for result in self.results if not result.success]
+
+    @property
+    def messages(self) -> int:
+        return sum(result.messages for result in self.results)
+
+    @property
+    def throughput(self) -> float:
+        """Merged messages per second"""
+        return self.messages / self.duration if self.duration > 0 else 0.0
+
+def _merge_worker(backup_dir: str, config: MergeConfig) -> MergeResult:
+    """Merge a single conversation, runs inside a worker process"""
+    start = time.perf_counter()
+    try:
+        messages = DataMerger(backup_dir).merge_conversation(config)
+        return MergeResult(config, messages=messages, duration=time.perf_counter() - start)
+    except Exception as e:
+        return MergeResult(config, duration=time.perf_counter() - start, error=str(e))
 
 class DataMerger:
-    def __init__(self):
-        self.backup_dir = os.path.join("backups", datetime.now().strftime("%Y%m%d_%H%M%S"))
+    def __init__(self, backup_dir: Optional[str] = None):
+        self.backup_dir = backup_dir or os.path.join("backups", datetime.now().strftime("%Y%m%d_%H%M%S"))
         
-    def merge_conversation(self, config: MergeConfig) -> None:
-        """Merge conversation between devices"""
+    def merge_conversations(self, configs: List[MergeConfig], max_workers: Optional[int] = None,
+                            progress: Optional[Callable[[MergeResult, int, int], None]] = None) -> BatchMergeReport:
+        """Merge many conversations in parallel on a process pool
+
+        Args:
+            configs: One config per conversation to merge
+            max_workers: Number of worker processes, defaults to the number of CPUs
+            progress: Called with (result, done, total) after every finished conversation
+
+        Returns:
+            Report with the result of every conversation, failures do not stop the batch
+        """
+        report = BatchMergeReport()
+        start = time.perf_counter()
+
+        for _, result in map_processes(_merge_worker, [(self.backup_dir, config) for config in configs], max_workers):
+            report.results.append(result())
+            if progress is not None:
+                progress(report.results[-1], len(report.results), len(configs))
+
+        report.duration = time.perf_counter() - start
+        return report
+
+    def merge_conversation(self, config: MergeConfig) -> int:
+        """Merge conversation between devices
+
+        Returns:
+            Number of messages written, for a full merge this is the merged conversation's size
+        """
         db_a = ChatLogs(config.device_a_path)
         db_b = ChatLogs(config.device_b_path)
 
@@ -29,26 +100,97 @@ class DataMerger:
         if config.target in ["both", "device_b"]:
             self._backup_db(db_b, config.account, config.conversation[0], 'db_b')
 
-        # TODO get on a date by date basis to save on memory
-        # Get messages from both devices
-        messages_a = db_a.get_backlog(config.account, config.conversation[0])
-        messages_b = db_b.get_backlog(config.account, config.conversation[0])
-        
-        # Create message maps with timestamps as keys for easy lookup
-        map_a = {} if len(messages_a) == 0 else  {self._get_message_key(m): m for m in messages_a}
-        map_b = {} if len(messages_b) == 0 else  {self._get_message_key(m): m for m in messages_b}
-        
-        # Get all unique timestamps
-        all_keys = sorted(set(map_a.keys()) | set(map_b.keys()))
-        
-        # Create merged database
-        merged_db = ChatLogs(os.path.join("temp", "merge"))
-        merged_db.clear(config.account, config.conversation[0])
-        
-        # Add all messages to merged database
-        for key in all_keys:
-            msg = map_a.get(key) or map_b.get(key)
-            merged_db.log_message(config.account, config.conversation, msg)
+        if config.incremental:
+            count = self._merge_incremental(db_a, db_b, config)
+            if count is not None:
+                return count
+
+        # Create merged database in its own directory, so parallel merges don't collide
+        merge_root = os.path.join("temp", "merge")
+        os.makedirs(merge_root, exist_ok=True)
+        merge_dir = tempfile.mkdtemp(dir=merge_root)
+        try:
+            count = self._merge_into(db_a, db_b, ChatLogs(merge_dir), config)
+        finally:
+            shutil.rmtree(merge_dir, ignore_errors=True)
+        return count
+
+    def _merge_incremental(self, db_a: ChatLogs, db_b: ChatLogs, config: MergeConfig) -> Optional[int]:
+        """Append the missing tail in place if one log is a prefix of the other
+
+        Returns:
+            Number of appended messages, or None if the logs diverged and need a full merge
+        """
+        key = config.conversation[0]
+        size_a = self._get_size(db_a.get_log_file(config.account, key))
+        size_b = self._get_size(db_b.get_log_file(config.account, key))
+        # appending needs an index on the target to extend
+        if key.lower() not in db_a.get_index(config.account) or key.lower() not in db_b.get_index(config.account):
+            return None
+
+        prefix = self._get_common_prefix(db_a, db_b, config.account, key)
+        if prefix == size_a and config.target in ["both", "device_a"]:
+            return self._append_tail(db_b, db_a, config, prefix)
+        if prefix == size_b and config.target in ["both", "device_b"]:
+            return self._append_tail(db_a, db_b, config, prefix)
+        if prefix in (size_a, size_b):
+            # the target already contains everything
+            return 0
+        return None
+
+    def _append_tail(self, source_db: ChatLogs, target_db: ChatLogs, config: MergeConfig, start: int) -> int:
+        """Append all records of the source log after start to the target log and its index"""
+        with target_db.open_writer(config.account, config.conversation) as writer:
+            return writer.write_all(source_db.iter_records(config.account, config.conversation[0], start_offset=start))
+
+    def _get_common_prefix(self, db_a: ChatLogs, db_b: ChatLogs, account: str, key: str) -> int:
+        """Get the length in bytes of the longest common prefix of both logs
+
+        Whole days are compared first using the day offsets of both indexes, the
+        first differing day is then compared record by record.
+        """
+        path_a = db_a.get_log_file(account, key)
+        path_b = db_b.get_log_file(account, key)
+        if self._get_size(path_a) == 0 or self._get_size(path_b) == 0:
+            return 0
+
+        prefix = 0
+        with open(path_a, 'rb') as file_a, open(path_b, 'rb') as file_b:
+            with mmap.mmap(file_a.fileno(), 0, access=mmap.ACCESS_READ) as log_a, \
+                 mmap.mmap(file_b.fileno(), 0, access=mmap.ACCESS_READ) as log_b:
+                days_a = db_a.get_day_ranges(account, key, len(log_a))
+                days_b = db_b.get_day_ranges(account, key, len(log_b))
+                # a day can be skipped if it has the same range in both logs, with the same bytes
+                for range_a, range_b in zip(days_a, days_b):
+                    if range_a != range_b:
+                        break
+                    _, start, end = range_a
+                    if log_a[start:end] != log_b[start:end]:
+                        break
+                    prefix = end
+
+        records_a = db_a.iter_records(account, key, start_offset=prefix)
+        records_b = db_b.iter_records(account, key, start_offset=prefix)
+        for record_a, record_b in zip(records_a, records_b):
+            if record_a.raw != record_b.raw:
+                break
+            prefix = record_a.end
+        return prefix
+
+    def _get_size(self, file_path: str) -> int:
+        return os.path.getsize(file_path) if os.path.exists(file_path) else 0
+
+    def _merge_into(self, db_a: ChatLogs, db_b: ChatLogs, merged_db: ChatLogs, config: MergeConfig) -> int:
+        """Write the merged conversation into merged_db and copy it to the target(s)"""
+        # Stream both logs forward and interleave them
+        records = self._merge_streams(
+            db_a.iter_records(config.account, config.conversation[0]),
+            db_b.iter_records(config.account, config.conversation[0])
+        )
+        with merged_db.open_writer(config.account, config.conversation) as writer:
+            count = writer.write_all(records)
+        # release the memory-mapped sources before their files get replaced
+        records = None
             
         merged_file = merged_db.get_log_file(config.account, config.conversation[0])
         merged_file_ix = merged_db.get_log_file_ix(config.account, config.conversation[0])
@@ -61,8 +203,40 @@ class DataMerger:
         if config.target in ["both", "device_b"]:
             self._copy_and_replace(merged_file, db_b.get_log_file(config.account, config.conversation[0]))
             self._copy_and_replace(merged_file_ix, db_b.get_log_file_ix(config.account, config.conversation[0]))
+
+        return count
         
     
+    def _merge_streams(self, records_a: Iterator[LogRecord], records_b: Iterator[LogRecord]) -> Iterator[LogRecord]:
+        """Interleave two time-ordered record streams like the merge step of a merge-sort
+
+        Only records sharing the current timestamp are held in memory. Duplicates
+        are removed within that window, records from device A come first.
+        """
+        rec_a: Optional[LogRecord] = next(records_a, None)
+        rec_b: Optional[LogRecord] = next(records_b, None)
+
+        while rec_a is not None or rec_b is not None:
+            if rec_b is None or (rec_a is not None and rec_a.timestamp <= rec_b.timestamp):
+                timestamp = rec_a.timestamp
+            else:
+                timestamp = rec_b.timestamp
+
+            # keys of all records already written for this timestamp
+            window = set()
+            while rec_a is not None and rec_a.timestamp == timestamp:
+                key = self._get_record_key(rec_a)
+                if key not in window:
+                    window.add(key)
+                    yield rec_a
+                rec_a = next(records_a, None)
+            while rec_b is not None and rec_b.timestamp == timestamp:
+                key = self._get_record_key(rec_b)
+                if key not in window:
+                    window.add(key)
+                    yield rec_b
+                rec_b = next(records_b, None)
+
     def _copy_and_replace(self, source_path, destination_path):
         if not os.path.exists(source_path):
             return
@@ -87,11 +261,9 @@ class DataMerger:
         os.makedirs(os.path.dirname(backup_file), exist_ok=True)
         shutil.copy2(log_file_ix, backup_file)
        
-    def _get_message_key(self, msg: Message) -> Tuple:
-        """Get unique key for message"""
-        return (
-            msg.time.timestamp(),
-            msg.type,
-            hash(msg.sender.name if msg.sender else ""),
-            hash(msg.text)
-        )
+    def _get_record_key(self, record: LogRecord) -> bytes:
+        """Get unique key for a serialized record
+
+        The raw bytes hold time, type, sender and text, so no decoding is needed.
+        """
+        return bytes(record.raw)
@@ -1,9 +1,14 @@
 import tkinter as tk
 from tkinter import ttk
+import tkinter.font as tkfont
 import ttkbootstrap as ttk
 from fchat_logs import ChatLogs
+from log_diff import DiffModel
 from localization import L10N
 
+# lines rendered above and below the visible part of the diff
+RENDER_MARGIN = 100
+
 class DiffViewer(ttk.Toplevel):
     def __init__(self, parent, account: str, conversation: str, device_a_db: ChatLogs, device_b_db: ChatLogs):
         super().__init__(parent)
@@ -17,9 +22,14 @@ class DiffViewer(ttk.Toplevel):
         self.device_b_db = device_b_db
         self.diff_blocks = []  # Store start and end lines of diff blocks
         self.current_block = -1  # Current block index
+        self.model = None
+        self.top_line = 0  # first visible line of the diff
+        self.window_start = 0  # first line rendered into the text widgets
+        self.window_end = 0  # line after the last rendered one
         
         self._create_ui()
         self._load_diff()
+        self.bind("<Destroy>", self._on_destroy)
         
     def _create_ui(self):
         """Create the diff view UI"""
@@ -107,15 +117,10 @@ class DiffViewer(ttk.Toplevel):
         self.scrollbar_y.configure(command=self._on_vertical_scroll)
         self.scrollbar_x.configure(command=self._on_horizontal_scroll)
         
-        # Configure text widget scrolling
-        self.left_text.configure(
-            yscrollcommand=self._on_left_scroll_y,
-            xscrollcommand=self._on_left_scroll_x
-        )
-        self.right_text.configure(
-            yscrollcommand=self._on_right_scroll_y,
-            xscrollcommand=self._on_right_scroll_x
-        )
+        # Configure text widget scrolling, vertical scrolling is virtual and handled by us
+        self.left_text.configure(xscrollcommand=self._on_left_scroll_x)
+        self.right_text.configure(xscrollcommand=self._on_right_scroll_x)
+        self.line_height = tkfont.Font(font=self.left_text.cget("font")).metrics("linespace")
         
         # Add frame to paned window
         self.paned.add(text_frame, weight=1)
@@ -129,33 +134,31 @@ class DiffViewer(ttk.Toplevel):
         self.right_text.tag_configure("current_diff", background="#6a4040")
         
         # Bind mouse wheel events for synchronized scrolling
-        self.left_text.bind("<MouseWheel>", self._on_mousewheel)
-        self.right_text.bind("<MouseWheel>", self._on_mousewheel)
+        for text in (self.left_text, self.right_text):
+            text.bind("<MouseWheel>", self._on_mousewheel)
+            text.bind("<Button-4>", lambda e: self._scroll_to(self.top_line - 3) or "break")
+            text.bind("<Button-5>", lambda e: self._scroll_to(self.top_line + 3) or "break")
+            text.bind("<Configure>", lambda e: self._scroll_to(self.top_line))
         
         # Bind keyboard shortcuts
         self.bind("<Alt-Up>", lambda e: self._goto_prev_diff())
         self.bind("<Alt-Down>", lambda e: self._goto_next_diff())
         
     def _on_vertical_scroll(self, *args):
-        """Sync vertical scrolling between both text widgets"""
-        self.left_text.yview(*args)
-        self.right_text.yview(*args)
+        """Handle the shared vertical scrollbar"""
+        if not self.model:
+            return
+        if args[0] == "moveto":
+            self._scroll_to(int(float(args[1]) * len(self.model)))
+        elif args[0] == "scroll":
+            step = self._visible_lines() if args[2] == "pages" else 1
+            self._scroll_to(self.top_line + int(args[1]) * step)
         
     def _on_horizontal_scroll(self, *args):
         """Sync horizontal scrolling between both text widgets"""
         self.left_text.xview(*args)
         self.right_text.xview(*args)
         
-    def _on_left_scroll_y(self, first, last):
-        """Handle left text vertical scroll"""
-        self.scrollbar_y.set(first, last)
-        self.right_text.yview_moveto(first)
-        
-    def _on_right_scroll_y(self, first, last):
-        """Handle right text vertical scroll"""
-        self.scrollbar_y.set(first, last)
-        self.left_text.yview_moveto(first)
-        
     def _on_left_scroll_x(self, first, last):
         """Handle left text horizontal scroll"""
         self.scrollbar_x.set(first, last)
@@ -168,107 +171,58 @@ class DiffViewer(ttk.Toplevel):
         
     def _on_mousewheel(self, event):
         """Handle mousewheel events for both text widgets"""
-        self.left_text.yview_scroll(int(-1 * (event.delta / 120)), "units")
-        self.right_text.yview_scroll(int(-1 * (event.delta / 120)), "units")
+        self._scroll_to(self.top_line + int(-3 * (event.delta / 120)))
         return "break"  # Prevent default scrolling
         
-    def _goto_prev_diff(self):
-        """Jump to previous difference"""
-        if not self.diff_blocks:
-            return
+    def _on_destroy(self, event):
+        """Release the mapped log files"""
+        if event.widget is self and self.model is not None:
+            self.model.close()
+            self.model = None
             
-        self.current_block = (self.current_block - 1) % len(self.diff_blocks)
-        self._highlight_current_diff()
+    def _visible_lines(self):
+        """Number of lines that fit into the text widgets"""
+        return max(1, self.left_text.winfo_height() // max(self.line_height, 1))
         
-    def _goto_next_diff(self):
-        """Jump to next difference"""
-        if not self.diff_blocks:
+    def _scroll_to(self, top_line):
+        """Show the diff starting at top_line, rendering more lines if needed"""
+        if not self.model:
             return
+        total = len(self.model)
+        visible = self._visible_lines()
+        self.top_line = max(0, min(top_line, total - visible))
+        
+        # only re-render once the view leaves the rendered window
+        if self.top_line < self.window_start or min(self.top_line + visible, total) > self.window_end:
+            try:
+                self._render(max(0, self.top_line - RENDER_MARGIN), visible + 2 * RENDER_MARGIN)
+            except (OSError, ValueError) as e:
+                self._show_error(e)
+                return
             
-        self.current_block = (self.current_block + 1) % len(self.diff_blocks)
-        self._highlight_current_diff()
-        
-    def _highlight_current_diff(self):
-        """Highlight the current difference block and scroll to it"""
-        # Remove previous current diff highlighting
-        self.left_text.tag_remove("current_diff", "1.0", "end")
-        self.right_text.tag_remove("current_diff", "1.0", "end")
+        for text in (self.left_text, self.right_text):
+            text.yview(f"{self.top_line - self.window_start + 1}.0")
+        self.scrollbar_y.set(self.top_line / max(total, 1), min(1.0, (self.top_line + visible) / max(total, 1)))
         
-        if not self.diff_blocks:
-            return
-            
-        # Get current block position
-        start_line, end_line = self.diff_blocks[self.current_block]
-        
-        # Add highlighting to the entire block
-        self.left_text.tag_add("current_diff", f"{start_line}.0", f"{end_line + 1}.0")
-        self.right_text.tag_add("current_diff", f"{start_line}.0", f"{end_line + 1}.0")
-        
-        # Scroll to make current diff visible
-        self.left_text.see(f"{start_line}.0")
-        self.right_text.see(f"{start_line}.0")
-        
-        # Update counter
-        self.diff_counter.configure(
-            text=L10N.get_text("change_blocks", current=self.current_block + 1, total=len(self.diff_blocks))
-        )
-        
-    def _load_diff(self):
-        """Load and display the diff between devices"""
-        # Get messages from both devices
-        messages_a = self.device_a_db.get_backlog(self.account, self.conversation)
-        messages_b = self.device_b_db.get_backlog(self.account, self.conversation)
-        
-        # Format messages for display
+    def _render(self, start, count):
+        """Format the lines [start, start + count) of the diff into both text widgets"""
         def format_message(msg):
             sender = msg.sender.name if msg.sender else "System"
             text = msg.text.split('\n')[0]  # Get first line only
             if len(text) > 80:
                 text = text[:77] + "..."
             return f"{msg.time.strftime('%Y-%m-%d %H:%M:%S')} | {sender}: {text}"
+            
+        self.window_start = start
+        self.window_end = min(start + count, len(self.model))
         
-        # Create message maps with timestamps as keys for easy lookup
-        map_a = {(m.time.timestamp(), m.type, m.sender.name if m.sender else "", m.text): m for m in messages_a}
-        map_b = {(m.time.timestamp(), m.type, m.sender.name if m.sender else "", m.text): m for m in messages_b}
-        
-        # Get all unique timestamps
-        all_keys = sorted(set(map_a.keys()) | set(map_b.keys()))
-        
-        # Clear existing text and differences
         self.left_text.configure(state="normal")
         self.right_text.configure(state="normal")
         self.left_text.delete("1.0", "end")
         self.right_text.delete("1.0", "end")
-        self.diff_blocks = []
-        self.current_block = -1
         
-        # Display messages with gaps
-        line_number = 1
-        block_start = None
-        last_a = False
-        last_b = False
-        
-        def end_block():
-            nonlocal block_start
-            if block_start is not None:
-                self.diff_blocks.append((block_start, line_number - 1))
-                block_start = None
-        
-        for key in all_keys:
-            msg_a = map_a.get(key)
-            msg_b = map_b.get(key)
-
-            is_diff = (last_a != bool(msg_a)) or (last_b != bool(msg_b))
-            last_a = bool(msg_a)
-            last_b = bool(msg_b)
-            
-            # Handle block start/end
-            if is_diff:
-                if block_start is None:
-                    block_start = line_number
-            else:
-                end_block()
-            
+        for line in range(self.window_start, self.window_end):
+            msg_a, msg_b = self.model.get_line(line)
             # Format lines with padding for missing messages
             if msg_a:
                 self.left_text.insert("end", format_message(msg_a) + "\n", 
@@ -282,14 +236,92 @@ class DiffViewer(ttk.Toplevel):
             else:
                 self.right_text.insert("end", "" * 80 + "\n", "gap")
                 
-            line_number += 1
-        
-        # Handle last block if it's still open
-        end_block()
+        self._tag_current_diff()
         
         # Make text widgets read-only
         self.left_text.configure(state="disabled")
         self.right_text.configure(state="disabled")
         
+    def _show_error(self, error):
+        """Replace the diff with an error message"""
+        print(f"Error loading diff: {error}")
+        if self.model is not None:
+            self.model.close()
+            self.model = None
+        self.diff_blocks = []
+        message = L10N.get_text("diff_failed_msg", error=error)
+        for text in (self.left_text, self.right_text):
+            text.configure(state="normal")
+            text.delete("1.0", "end")
+            text.insert("end", message + "\n")
+            text.configure(state="disabled")
+        self.diff_counter.configure(text=L10N.get_text("change_blocks", current=0, total=0))
+        
+    def _tag_current_diff(self):
+        """Highlight the part of the current block that is rendered"""
+        self.left_text.tag_remove("current_diff", "1.0", "end")
+        self.right_text.tag_remove("current_diff", "1.0", "end")
+        if not 0 <= self.current_block < len(self.diff_blocks):
+            return
+        start_line, end_line = self.diff_blocks[self.current_block]
+        start_line = max(start_line, self.window_start)
+        end_line = min(end_line, self.window_end - 1)
+        if start_line > end_line:
+            return
+        first = start_line - self.window_start + 1
+        last = end_line - self.window_start + 2
+        self.left_text.tag_add("current_diff", f"{first}.0", f"{last}.0")
+        self.right_text.tag_add("current_diff", f"{first}.0", f"{last}.0")
+        
+    def _goto_prev_diff(self):
+        """Jump to previous difference"""
+        if not self.diff_blocks:
+            return
+            
+        self.current_block = (self.current_block - 1) % len(self.diff_blocks)
+        self._highlight_current_diff()
+        
+    def _goto_next_diff(self):
+        """Jump to next difference"""
+        if not self.diff_blocks:
+            return
+            
+        self.current_block = (self.current_block + 1) % len(self.diff_blocks)
+        self._highlight_current_diff()
+        
+    def _highlight_current_diff(self):
+        """Highlight the current difference block and scroll to it"""
+        if not self.diff_blocks:
+            return
+            
+        # Get current block position and scroll to make it visible
+        start_line, _ = self.diff_blocks[self.current_block]
+        self._scroll_to(max(0, start_line - 3))
+        self._tag_current_diff()
+        
+        # Update counter
+        self.diff_counter.configure(
+            text=L10N.get_text("change_blocks", current=self.current_block + 1, total=len(self.diff_blocks))
+        )
+        
+    def _load_diff(self):
+        """Load the diff between devices and display its beginning"""
+        if self.model is not None:
+            self.model.close()
+        # Only the alignment is computed here, lines are decoded while scrolling
+        try:
+            self.model = DiffModel(self.device_a_db, self.device_b_db, self.account, self.conversation)
+        except (OSError, ValueError) as e:
+            # e.g. a corrupt log or one that F-Chat is still writing
+            self.model = None
+            self._show_error(e)
+            return
+        self.diff_blocks = self.model.blocks
+        self.current_block = -1
+        self.window_start = self.window_end = 0
+        
+        self.update_idletasks()
+        self._scroll_to(0)
+        
         # Update difference counter
         self.diff_counter.configure(text=L10N.get_text("change_blocks", current=0, total=len(self.diff_blocks)))
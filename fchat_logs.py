@@ -1,13 +1,27 @@
 import os
+import re
+import mmap
+import zlib
+import hashlib
+import bisect
+import time
 import struct
 import argparse
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple, Any, Union, Callable
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import MutableMapping, Sequence
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Any, Union, Callable, Iterator, Iterable
 from datetime import datetime
 from dateutil.tz import tzlocal 
 from enum import Enum
 
 DAY_MS = 24 * 60 * 60 * 1000  # milliseconds in a day
+SALVAGE_MIN_TIMESTAMP = 1262304000  # 2010-01-01, records found while salvaging must be newer
+INDEX_CACHE_SIZE = 16  # characters whose index is kept in memory
 LOCAL_TZ = tzlocal()
 
 @dataclass
@@ -48,12 +62,593 @@ class IndexItem:
     index: Dict[int, int]  # day timestamp -> offset index
     offsets: List[int]     # actual file offsets
 
+@dataclass
+class LogPage:
+    messages: List[Message]
+    start: int  # file offset of the first message
+    end: int    # file offset after the last message
+
+@dataclass
+class RepairResult:
+    """Outcome of repairing a single log file"""
+    key: str
+    records: int = 0          # valid records kept
+    file_size: int = 0        # size of the log before the repair
+    valid_size: int = 0       # size of the log after the repair
+    index_rewritten: bool = False
+    damage: Optional[str] = None  # first problem found in the log, None if it is intact
+    removed: List[Tuple[int, int]] = field(default_factory=list)  # (start, end) of removed damaged bytes
+    error: Optional[str] = None   # why the repair failed
+
+    @property
+    def truncated(self) -> bool:
+        return self.valid_size < self.file_size
+
+@dataclass
+class RepairReport:
+    """Aggregated outcome of repairing the logs of a character"""
+    character: str
+    results: List[RepairResult] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)  # index files without a log
+    duration: float = 0.0
+
+    @property
+    def repaired(self) -> List[RepairResult]:
+        return [result for result in self.results if result.truncated or result.index_rewritten]
+
+    @property
+    def failed(self) -> List[RepairResult]:
+        return [result for result in self.results if result.error is not None]
+
+class SenderTable:
+    """Shared Character instances of all message senders, keyed by the encoded name
+
+    Names that were seen before are not decoded again.
+    """
+    def __init__(self):
+        self.characters: Dict[bytes, Character] = {}
+
+    def get(self, name_bytes: bytes) -> Character:
+        name_bytes = bytes(name_bytes)
+        character = self.characters.get(name_bytes)
+        if character is None:
+            character = self.characters[name_bytes] = Character(name=str(name_bytes, 'utf-8'))
+        return character
+
+class MessageStore(Sequence):
+    """Column-wise storage of decoded messages
+
+    Timestamps, types and sender ids are kept in compact arrays and all texts in a
+    single UTF-8 blob. Indexing creates the Message on access, messages of the same
+    sender share one Character of the sender table.
+    """
+    def __init__(self, sender_table: Optional[SenderTable] = None):
+        self.sender_table = sender_table or SenderTable()
+        self.timestamps = array('I')
+        self.types = bytearray()
+        self.sender_ids = array('I')
+        self.senders: List[Character] = []
+        self._sender_ids: Dict[str, int] = {}
+        self.text = bytearray()
+        self.text_offsets = array('Q', [0])  # text of message i is text[text_offsets[i]:text_offsets[i + 1]]
+
+    def append_raw(self, timestamp: int, msg_type: int, name_bytes: bytes, text_bytes: bytes) -> None:
+        self._append(timestamp, msg_type, self.sender_table.get(name_bytes), text_bytes)
+
+    def _append(self, timestamp: int, msg_type: int, sender: Character, text_bytes: bytes) -> None:
+        sender_id = self._sender_ids.get(sender.name)
+        if sender_id is None:
+            sender_id = self._sender_ids[sender.name] = len(self.senders)
+            self.senders.append(sender)
+        self.timestamps.append(timestamp)
+        self.types.append(msg_type)
+        self.sender_ids.append(sender_id)
+        self.text += text_bytes
+        self.text_offsets.append(len(self.text))
+
+    def append_record(self, record: "LogRecord") -> None:
+        self.append_raw(record.timestamp, record.type, record.name_bytes, record.text_bytes)
+
+    def append_serialized(self, buffer: bytes, offset: int = 0) -> None:
+        """Append a serialized message without decoding it"""
+        timestamp, msg_type, name_len = struct.unpack_from('<IBB', buffer, offset)
+        name_end = offset + 6 + name_len
+        text_len = struct.unpack_from('<H', buffer, name_end)[0]
+        self.append_raw(timestamp, msg_type, buffer[offset + 6:name_end], buffer[name_end + 2:name_end + 2 + text_len])
+
+    def reverse(self) -> None:
+        """Reverse the order of the messages in place"""
+        text = bytearray()
+        for position in range(len(self) - 1, -1, -1):
+            text += self.text[self.text_offsets[position]:self.text_offsets[position + 1]]
+        offsets = array('Q', [0])
+        for position in range(len(self) - 1, -1, -1):
+            offsets.append(offsets[-1] + self.text_offsets[position + 1] - self.text_offsets[position])
+        self.timestamps.reverse()
+        self.types.reverse()
+        self.sender_ids.reverse()
+        self.text = text
+        self.text_offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, position: Union[int, slice]) -> Union[Message, "MessageStore"]:
+        if isinstance(position, slice):
+            store = MessageStore(self.sender_table)
+            for index in range(len(self))[position]:
+                store._append(
+                    self.timestamps[index],
+                    self.types[index],
+                    self.senders[self.sender_ids[index]],
+                    self.text[self.text_offsets[index]:self.text_offsets[index + 1]]
+                )
+            return store
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("message index out of range")
+        return Message(
+            time=datetime.fromtimestamp(self.timestamps[position], LOCAL_TZ),
+            type=self.types[position],
+            sender=self.senders[self.sender_ids[position]],
+            text=str(self.text[self.text_offsets[position]:self.text_offsets[position + 1]], 'utf-8')
+        )
+
+    def __iter__(self) -> Iterator[Message]:
+        for position in range(len(self)):
+            yield self[position]
+
+class LogRecord:
+    """Lightweight view of one serialized message inside a log buffer
+
+    Nothing is decoded until the corresponding property is accessed.
+    """
+    __slots__ = ('buffer', 'offset', 'size')
+
+    def __init__(self, buffer: memoryview, offset: int, size: int):
+        self.buffer = buffer
+        self.offset = offset
+        self.size = size
+
+    @property
+    def end(self) -> int:
+        """File offset directly after this record"""
+        return self.offset + self.size
+
+    @property
+    def timestamp(self) -> int:
+        return struct.unpack_from('<I', self.buffer, self.offset)[0]
+
+    @property
+    def type(self) -> int:
+        return self.buffer[self.offset + 4]
+
+    @property
+    def name_bytes(self) -> memoryview:
+        start = self.offset + 6
+        return self.buffer[start:start + self.buffer[self.offset + 5]]
+
+    @property
+    def text_bytes(self) -> memoryview:
+        start = self.offset + 8 + self.buffer[self.offset + 5]
+        return self.buffer[start:self.offset + self.size - 2]
+
+    @property
+    def raw(self) -> memoryview:
+        """The complete serialized record including both size fields"""
+        return self.buffer[self.offset:self.offset + self.size]
+
+    @property
+    def name(self) -> str:
+        return str(self.name_bytes, 'utf-8')
+
+    @property
+    def text(self) -> str:
+        return str(self.text_bytes, 'utf-8')
+
+    @property
+    def time(self) -> datetime:
+        return datetime.fromtimestamp(self.timestamp, LOCAL_TZ)
+
+    def to_message(self, sender_table: Optional[SenderTable] = None) -> Message:
+        return Message(
+            time=self.time,
+            type=self.type,
+            sender=Character(name=self.name) if sender_table is None else sender_table.get(self.name_bytes),
+            text=self.text
+        )
+
+class UtcOffsetTable:
+    """Cached UTC offsets of a timezone, looked up by epoch seconds
+
+    Offsets are cached per UTC day. Days containing a transition (e.g. daylight
+    saving time) are resolved per minute.
+    """
+    def __init__(self, tz):
+        self.tz = tz
+        self.days: Dict[int, Optional[int]] = {}
+        self.minutes: Dict[int, int] = {}
+
+    def _lookup(self, timestamp: int) -> int:
+        return int(datetime.fromtimestamp(timestamp, self.tz).utcoffset().total_seconds())
+
+    def _day_offset(self, day: int) -> Optional[int]:
+        """Offset of a whole UTC day, None if it contains a transition"""
+        if day not in self.days:
+            first = self._lookup(day * 86400)
+            self.days[day] = first if first == self._lookup(day * 86400 + 86399) else None
+        return self.days[day]
+
+    def is_transition_day(self, day: int) -> bool:
+        """Whether the UTC offset changes during the given UTC day (epoch seconds // 86400)"""
+        return self._day_offset(day) is None
+
+    def offset(self, timestamp: int) -> int:
+        """Get the UTC offset in seconds at the given epoch second"""
+        offset = self._day_offset(timestamp // 86400)
+        if offset is None:
+            minute = timestamp // 60
+            offset = self.minutes.get(minute)
+            if offset is None:
+                offset = self.minutes[minute] = self._lookup(minute * 60)
+        return offset
+
+    def local_day(self, timestamp: int) -> int:
+        """Get the number of the local calendar day, e.g. to group timestamps by date"""
+        return (timestamp + self.offset(timestamp)) // 86400
+
+LOCAL_OFFSETS = UtcOffsetTable(LOCAL_TZ)
+
+def map_processes(function: Callable[..., Any], jobs: List[Tuple], max_workers: Optional[int] = None) -> Iterator[Tuple[Tuple, Callable[[], Any]]]:
+    """Run function(*job) for every job on a process pool
+
+    A single job or max_workers=1 runs in this process instead.
+
+    Yields:
+        (job, result) in order of completion, calling result() returns the value or raises the error of the job
+    """
+    if max_workers == 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield job, lambda job=job: function(*job)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(function, *job): job for job in jobs}
+            for future in as_completed(futures):
+                yield futures[future], future.result
+
+def get_cache_path(log_directory: str, folder: str, extension: str) -> str:
+    """Get the path of a cache file of a data folder under ~/.fchat_merger/<folder>"""
+    root_hash = hashlib.sha1(os.path.abspath(log_directory).encode('utf-8')).hexdigest()[:16]
+    return os.path.expanduser(os.path.join("~/.fchat_merger", folder, root_hash + extension))
+
+def is_prefix_intact(file_path: str, last_offset: Optional[int], last_crc: Optional[int], end: int) -> bool:
+    """Check that the last message read up to end is still where it was, byte for byte
+
+    Messages of a burst share their timestamp, so after a merge inserted earlier
+    messages a different one with the same timestamp may be at the same offset.
+    """
+    if last_offset is None:
+        return end == 0
+    try:
+        with open(file_path, 'rb') as f:
+            f.seek(last_offset)
+            record = f.read(end - last_offset)
+    except OSError:
+        return False
+    return len(record) == end - last_offset and last_crc is not None and zlib.crc32(record) == last_crc
+
+@contextmanager
+def map_log(file_path: str) -> Iterator[bytes]:
+    """Memory-map a log file read-only, missing or empty files map to b''"""
+    if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+        yield b''
+        return
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield mapped
+
+class CharacterIndex(MutableMapping):
+    """Index files of a character, keyed by lower-case conversation key
+
+    Only the file names are listed up front. A conversation's day table is parsed
+    when it is first accessed. If its file changed since, only appended entries
+    are read, a rewritten file is parsed again. Call refresh() to pick up added
+    or removed index files. Safe to use from multiple threads.
+    """
+    def __init__(self, dir_path: str):
+        self.dir_path = dir_path
+        self.files: Dict[str, str] = {}           # key -> index file name
+        self.items: Dict[str, IndexItem] = {}     # parsed or newly created items
+        self.stats: Dict[str, Tuple[int, int, int]] = {}  # key -> (size, mtime, generation) when parsed
+        self.names: Dict[str, str] = {}           # display names read from the file headers
+        self.dir_mtime = None
+        self.generation = 0
+        self._lock = threading.RLock()
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Re-list the directory if it changed, items are checked against their file on next access"""
+        with self._lock:
+            self.generation += 1
+            try:
+                dir_mtime = os.stat(self.dir_path).st_mtime_ns
+            except OSError:
+                dir_mtime = None
+            if dir_mtime is not None and dir_mtime == self.dir_mtime:
+                return
+            self.dir_mtime = dir_mtime
+            try:
+                files = {entry.name[:-4].lower(): entry.name for entry in os.scandir(self.dir_path) if entry.name.endswith('.idx')}
+            except OSError as e:
+                print(f"Error loading index: {e}")
+                files = {}
+            for key in self.files.keys() - files.keys():
+                self.items.pop(key, None)
+                self.stats.pop(key, None)
+                self.names.pop(key, None)
+            self.files = files
+
+    def _load(self, key: str) -> Optional[IndexItem]:
+        """Parse the day table of a conversation if it was not parsed since the last refresh"""
+        with self._lock:
+            file_name = self.files.get(key)
+            if file_name is None:
+                return self.items.get(key)
+            cached = self.stats.get(key)
+            if cached is not None and cached[2] == self.generation and key in self.items:
+                return self.items[key]
+
+            file_path = os.path.join(self.dir_path, file_name)
+            try:
+                stat = os.stat(file_path)
+                if cached is not None and key in self.items and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+                    self.stats[key] = (stat.st_size, stat.st_mtime_ns, self.generation)
+                    return self.items[key]
+                if cached is not None and key in self.items and cached[0] < stat.st_size and self._load_appended(key, file_path, cached[0]):
+                    self.stats[key] = (stat.st_size, stat.st_mtime_ns, self.generation)
+                    return self.items[key]
+                with open(file_path, 'rb') as f:
+                    content = f.read()
+            except OSError as e:
+                print(f"Error loading index: {e}")
+                return self.items.get(key)
+
+            offset = content[0] + 1 if content else 0
+            item = IndexItem(name=content[1:offset].decode('utf-8'), index={}, offsets=[])
+            # entries are a 2 byte day and a 5 byte offset, split into 4 + 1 bytes to unpack them at once
+            end = offset + (len(content) - offset) // 7 * 7
+            for day, low, high in struct.iter_unpack('<HIB', memoryview(content)[offset:end]):
+                item.index[day] = len(item.offsets)
+                item.offsets.append(low | high << 32)
+            self.items[key] = item
+            self.names[key] = item.name
+            self.stats[key] = (stat.st_size, stat.st_mtime_ns, self.generation)
+            return item
+
+    def _load_appended(self, key: str, file_path: str, parsed_size: int) -> bool:
+        """Add the entries appended to an index file since it was parsed with the given size
+
+        Returns:
+            False if the file was replaced instead, it then has to be parsed again
+        """
+        item = self.items[key]
+        name_bytes = item.name.encode('utf-8')
+        header = bytes([len(name_bytes)]) + name_bytes
+        start = len(header) + (parsed_size - len(header)) // 7 * 7
+        with open(file_path, 'rb') as f:
+            if f.read(len(header)) != header:
+                return False
+            # the last parsed entry has to be unchanged, otherwise this is not an append
+            known = start > len(header)
+            f.seek(start - 7 if known else start)
+            content = f.read()
+        entries = struct.iter_unpack('<HIB', memoryview(content)[:len(content) // 7 * 7])
+        if known:
+            day, low, high = next(entries)
+            position = item.index.get(day)
+            if position is None or item.offsets[position] != low | high << 32:
+                return False
+        for day, low, high in entries:
+            offset = low | high << 32
+            position = item.index.get(day)
+            if position is not None and item.offsets[position] == offset:
+                # already added in memory by a writer of this process
+                continue
+            item.index[day] = len(item.offsets)
+            item.offsets.append(offset)
+        return True
+
+    def get_name(self, key: str) -> str:
+        """Get the display name of a conversation, reading only the header of its index file"""
+        with self._lock:
+            name = self.names.get(key)
+            if name is None:
+                item = self.items.get(key)
+                if item is not None:
+                    return item.name
+                try:
+                    with open(os.path.join(self.dir_path, self.files[key]), 'rb') as f:
+                        header = f.read(256)
+                    name = self.names[key] = header[1:header[0] + 1].decode('utf-8') if header else ""
+                except OSError as e:
+                    print(f"Error loading index: {e}")
+                    return ""
+            return name
+
+    def __getitem__(self, key: str) -> IndexItem:
+        item = self._load(key)
+        if item is None:
+            raise KeyError(key)
+        return item
+
+    def __setitem__(self, key: str, item: IndexItem) -> None:
+        with self._lock:
+            self.items[key] = item
+
+    def __delitem__(self, key: str) -> None:
+        with self._lock:
+            if key not in self:
+                raise KeyError(key)
+            self.files.pop(key, None)
+            self.items.pop(key, None)
+            self.stats.pop(key, None)
+            self.names.pop(key, None)
+
+    def __contains__(self, key) -> bool:
+        return key in self.files or key in self.items
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            keys = list(self.files) + [key for key in self.items if key not in self.files]
+        yield from keys
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self.files) + sum(1 for key in self.items if key not in self.files)
+
+def _check_record(buffer: bytes, pos: int, size: int) -> Tuple[int, Optional[str]]:
+    """Get the size of the record at pos, or the reason why it is broken"""
+    if pos + 8 > size or pos + 8 + buffer[pos + 5] > size:
+        return 0, "Incomplete message"
+    name_end = pos + 6 + buffer[pos + 5]
+    record_size = buffer[pos + 5] + struct.unpack_from('<H', buffer, name_end)[0] + 10
+    if pos + record_size > size:
+        return 0, "Incomplete message"
+    if struct.unpack_from('<H', buffer, pos + record_size - 2)[0] != record_size - 2:
+        return 0, "Invalid message size marker"
+    try:
+        str(buffer[pos + 6:name_end], 'utf-8')
+        str(buffer[name_end + 2:pos + record_size - 2], 'utf-8')
+    except UnicodeDecodeError:
+        return 0, "Invalid UTF-8"
+    return record_size, None
+
+def _find_record(buffer: bytes, start: int, size: int) -> int:
+    """Find the next plausible record at or after start, returns size if there is none
+
+    Candidates need a timestamp between SALVAGE_MIN_TIMESTAMP and tomorrow and a known
+    message type. Both are pre-filtered by a regular expression, so every byte is
+    looked at once. A candidate is taken if it is a valid record followed by
+    another valid record or the end of the file.
+    """
+    max_timestamp = int(time.time()) + 86400
+    # highest timestamp byte followed by the type byte
+    candidates = re.compile(rb"[%s-%s][\x00-%s]" % (
+        re.escape(bytes([SALVAGE_MIN_TIMESTAMP >> 24])),
+        re.escape(bytes([max_timestamp >> 24])),
+        re.escape(bytes([len(MessageType) - 1]))
+    ))
+    for match in candidates.finditer(buffer, start + 3):
+        pos = match.start() - 3
+        if not SALVAGE_MIN_TIMESTAMP <= struct.unpack_from('<I', buffer, pos)[0] <= max_timestamp:
+            continue
+        record_size, damage = _check_record(buffer, pos, size)
+        if damage is None and (pos + record_size == size or _check_record(buffer, pos + record_size, size)[1] is None):
+            return pos
+    return size
+
+def _repair_log(log_directory: str, character: str, key: str, salvage: bool = False, quarantine_dir: Optional[str] = None) -> RepairResult:
+    """Validate a log in one pass, remove broken records and rebuild its index
+
+    Runs inside a worker process. The size field in front of every record and the
+    size marker behind it have to agree, so the log reads the same forward and
+    backward. The log is cut at the first broken record, with salvage the scan
+    continues at the next plausible record instead and only the damaged bytes are
+    removed. These are kept in quarantine_dir if given. The index is only replaced
+    if its content changed.
+    """
+    db = ChatLogs(log_directory)
+    log_path = db.get_log_file(character, key)
+    index_path = db.get_log_file_ix(character, key)
+    result = RepairResult(key)
+    try:
+        try:
+            with open(index_path, 'rb') as f:
+                old_index = f.read()
+        except FileNotFoundError:
+            old_index = b''
+        name_end = old_index[0] + 1 if old_index else 0
+        if 0 < name_end <= len(old_index):
+            header = old_index[:name_end]
+        else:
+            # no usable index, the key is the best name we have
+            name_bytes = key.encode('utf-8')[:255]
+            header = bytes([len(name_bytes)]) + name_bytes
+        index = bytearray(header)
+
+        with open(log_path, 'rb') as f:
+            size = result.file_size = os.fstat(f.fileno()).st_size
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b''
+        try:
+            pos = 0
+            removed = 0
+            days = set()
+            while pos < size:
+                record_size, damage = _check_record(buffer, pos, size)
+                if damage is not None:
+                    if result.damage is None:
+                        result.damage = f"{damage} at offset {pos}"
+                    end = _find_record(buffer, pos + 1, size) if salvage else size
+                    result.removed.append((pos, end))
+                    removed += end - pos
+                    pos = end
+                    continue
+
+                # same entries as check_index_day writes: the first message of every day
+                day = db.get_day_of_timestamp(struct.unpack_from('<I', buffer, pos)[0])
+                if day not in days:
+                    offset = pos - removed
+                    index += struct.pack('<HIB', day, offset & 0xFFFFFFFF, offset >> 32)
+                    days.add(day)
+                pos += record_size
+                result.records += 1
+            result.valid_size = size - removed
+            # damage at the end is cut off, otherwise the kept records are copied to a new log
+            rewrite = any(end < size for _, end in result.removed)
+
+            # slices of a memoryview write straight from the mapping instead of copying gigabytes
+            with memoryview(buffer) as view:
+                if quarantine_dir is not None and result.removed:
+                    os.makedirs(os.path.join(quarantine_dir, character), exist_ok=True)
+                    for start, end in result.removed:
+                        with open(os.path.join(quarantine_dir, character, f"{key}.{start}"), 'wb') as f:
+                            f.write(view[start:end])
+                if rewrite:
+                    temp_path = log_path + '.tmp'
+                    with open(temp_path, 'wb') as f:
+                        kept = 0
+                        for start, end in result.removed + [(size, size)]:
+                            f.write(view[kept:start])
+                            kept = end
+        finally:
+            if size > 0:
+                buffer.close()
+
+        if rewrite:
+            os.replace(log_path + '.tmp', log_path)
+        elif result.truncated:
+            os.truncate(log_path, result.valid_size)
+        if index != old_index:
+            temp_path = index_path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(index)
+            os.replace(temp_path, index_path)
+            result.index_rewritten = True
+    except Exception as e:
+        result.error = str(e)
+    return result
+
 class ChatLogs:
-    def __init__(self, log_directory):
+    def __init__(self, log_directory, manifest=None):
         self.log_directory = log_directory
-        self.index: Dict[str, IndexItem] = {}
-        self.loaded_index: Optional[Dict[str, IndexItem]] = None
+        # optional ManifestCache that answers the character and conversation listings
+        self.manifest = manifest
+        self.index: "MutableMapping[str, IndexItem]" = {}
         self.loaded_character: Optional[str] = None
+        # most recently used characters last
+        self.indices: "OrderedDict[str, CharacterIndex]" = OrderedDict()
+        self._index_lock = threading.Lock()
+        self.senders = SenderTable()
 
     def get_log_dir(self, character: str) -> str:
         """Get the logs directory for a character"""
@@ -110,9 +705,8 @@ class ChatLogs:
         name_len = buffer[offset + 5]
         curr_offset = offset + 6
 
-        # read sender name
-        name_bytes =  buffer[curr_offset:curr_offset + name_len]
-        sender_name = name_bytes.decode('utf-8')
+        # read sender name, known senders are shared instead of decoded again
+        sender = self.senders.get(buffer[curr_offset:curr_offset + name_len])
         curr_offset += name_len
         
         # read message
@@ -129,17 +723,36 @@ class ChatLogs:
         return Message(
             time=datetime.fromtimestamp(timestamp, LOCAL_TZ),
             type=msg_type,
-            sender=Character(name=sender_name),
+            sender=sender,
             text=text
             # 6 bytes prefix,  2 bytes text_length, 2 bytes size_marker
         ), name_len + text_len + 10  
 
+    def get_day(self, time: datetime) -> int:
+        """Get the day number used as key in the index files"""
+        utc_offset_seconds = 0 if time.utcoffset() is None else time.utcoffset().total_seconds()
+        return int(time.timestamp() * 1000 / DAY_MS - utc_offset_seconds / 60 / 1440)
+
+    def get_day_of_timestamp(self, timestamp: int) -> int:
+        """Get the index day number of a message timestamp in the local timezone
+
+        Same result as get_day() on a local datetime, without creating one.
+        """
+        return int(timestamp * 1000 / DAY_MS - LOCAL_OFFSETS.offset(timestamp) / 60 / 1440)
+
     def check_index(self, message: Message, key: str, name: str, size: int) -> Optional[bytes]:
         """Update index for a new message and return bytes to write to index file"""
-        utc_offset_seconds = 0 if message.time.utcoffset() is None else message.time.utcoffset().total_seconds()
-        date = int(message.time.timestamp() * 1000 / DAY_MS - utc_offset_seconds / 60 / 1440)
-        
-        item = self.index.get(key)
+        return self.check_index_day(self.get_day(message.time), key, name, size)
+
+    def check_index_day(self, date: int, key: str, name: str, size: int, index: Optional[CharacterIndex] = None) -> Optional[bytes]:
+        """Update index for a message of the given day number and return bytes to write to index file
+
+        Args:
+            index: Index of the conversation's character, defaults to the last loaded one
+        """
+        if index is None:
+            index = self.index
+        item = index.get(key)
         if item is not None:
             # we already have an offset stored for this date
             if date in item.index:
@@ -148,7 +761,7 @@ class ChatLogs:
             offset = 0
         else:
             # no index file exists for this conversation, we create a new one
-            self.index[key] = item = IndexItem(name=name, index={}, offsets=[])
+            index[key] = item = IndexItem(name=name, index={}, offsets=[])
             name_bytes = name.encode('utf-8')
             name_len = len(name_bytes)
             # we initially create a buffer that contains
@@ -175,45 +788,23 @@ class ChatLogs:
 
         return bytes(buffer)
 
-    def get_index(self, name: str) -> Dict[str, IndexItem]:
-        """Load index for a character"""
-        if self.loaded_character == name:
-            return self.index or {}
-            
-        self.loaded_character = name
-        self.index = {}
-        
-        dir_path = self.get_log_dir(name)
-        try:
-            for file in os.listdir(dir_path):
-                if not file.endswith('.idx'):
-                    continue
-                    
-                with open(os.path.join(dir_path, file), 'rb') as f:
-                    content = f.read()
-                    name_len = content[0]
-                    offset = name_len + 1
-                    
-                    item = IndexItem(
-                        name=content[1:offset].decode('utf-8'),
-                        index={},
-                        offsets=[]
-                    )
-                    
-                    while offset < len(content):
-                        day = struct.unpack_from('<H', content, offset)[0]
-                        file_offset = sum(content[offset+2+i] << (i*8) for i in range(5))
-                        item.index[day] = len(item.offsets)
-                        item.offsets.append(file_offset)
-                        offset += 7
-                        
-                    self.index[file[:-4].lower()] = item
-                    
-        except Exception as e:
-            print(f"Error loading index: {e}")
-            
-        return self.index
+    def get_index(self, name: str) -> CharacterIndex:
+        """Get the index of a character, day tables are parsed when a conversation is accessed
 
+        The indices of the last INDEX_CACHE_SIZE characters are kept in memory.
+        """
+        with self._index_lock:
+            index = self.indices.get(name)
+            if index is None:
+                index = self.indices[name] = CharacterIndex(self.get_log_dir(name))
+                if len(self.indices) > INDEX_CACHE_SIZE:
+                    self.indices.popitem(last=False)
+            else:
+                self.indices.move_to_end(name)
+                index.refresh()
+            self.loaded_character = name
+            self.index = index
+        return index
 
     def validate_msg_size(self, buffer : bytes, offset : int, size_marker : int) -> bool:
         # append name length to offset (skip timestamp and msg_type)
@@ -241,45 +832,188 @@ class ChatLogs:
         result = self._read_backlog(character, conversation_key, _size_handler)
         return 0 if result is None else result
 
-    def get_log_dates(self, character: str, conversation_key: str) -> List[datetime]:
-        def _date_handler(buffer : bytes, offset : int, result : List[datetime] = None) -> Tuple[List[datetime], bool]:
-            # initialize result
-            if result is None:
-                result = list()
-            
-            # timestamp in millis (without timezone data)
-            timestamp = struct.unpack_from('<I', buffer, offset)[0]
-            new_date = datetime.fromtimestamp(timestamp, LOCAL_TZ)
-            if len(result) == 0 or (result[0] - new_date).days != 0:
-                result.insert(0, new_date)
-            return result, True
-        
-        # read through backlog using handler
-        result = self._read_backlog(character, conversation_key, _date_handler)
-        return [] if result is None else result
+    def get_log_dates(self, character: str, conversation_key: str, verify: bool = False) -> List[datetime]:
+        """Get the dates with messages from the index, oldest first
 
-    def get_backlog(self, character: str, conversation_key: str, count: int = -1, date: datetime = None) -> List[Message]:
-        def _msg_handler(buffer : bytes, offset : int, result: List[Message] = None):
+        Only the timestamps of the first and the last message of every indexed day
+        are read, the last one is found through the size marker in front of the
+        next indexed offset.
+
+        Args:
+            verify: Additionally scan the whole log and prefer its dates if the index disagrees
+        """
+        item = self.get_index(character).get(conversation_key.lower())
+        file_path = self.get_log_file(character, conversation_key)
+        result: List[datetime] = []
+        if item is not None and os.path.exists(file_path):
+            try:
+                with open(file_path, 'rb') as f:
+                    size = os.fstat(f.fileno()).st_size
+                    offsets = sorted(offset for offset in item.offsets if offset + 4 <= size)
+                    if offsets:
+                        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                            last_day = None
+                            for offset, end in zip(offsets, offsets[1:] + [size]):
+                                timestamps = [struct.unpack_from('<I', buffer, offset)[0]]
+                                if end - 2 > offset:
+                                    # an indexed day can span two local dates, its last record ends at the next offset
+                                    last_start = end - 2 - struct.unpack_from('<H', buffer, end - 2)[0]
+                                    if offset < last_start <= end - 4:
+                                        timestamps.append(struct.unpack_from('<I', buffer, last_start)[0])
+                                for timestamp in timestamps:
+                                    day = LOCAL_OFFSETS.local_day(timestamp)
+                                    if last_day is None or day > last_day:
+                                        result.append(datetime.fromtimestamp(timestamp, LOCAL_TZ))
+                                        last_day = day
+            except Exception as e:
+                print(f"Error reading dates of file {file_path}: {e}")
+
+        if verify:
+            scanned = self._scan_log_dates(character, conversation_key)
+            if [d.date() for d in scanned] != [d.date() for d in result]:
+                print(f"Index of {character}/{conversation_key} does not match its log, using scanned dates")
+                return scanned
+        return result
+
+    def _scan_log_dates(self, character: str, conversation_key: str) -> List[datetime]:
+        """Get the dates with messages by reading every record of the log"""
+        result: List[datetime] = []
+        last_day = None
+        try:
+            for record in self.iter_records(character, conversation_key):
+                day = LOCAL_OFFSETS.local_day(record.timestamp)
+                if day != last_day:
+                    result.append(record.time)
+                    last_day = day
+        except ValueError as e:
+            print(f"Error scanning dates of {character}/{conversation_key}: {e}")
+        return result
+
+    def get_backlog(self, character: str, conversation_key: str, count: int = -1, date: datetime = None) -> MessageStore:
+        if date is not None:
+            return self._get_backlog_of_day(character, conversation_key, count, date)
+
+        def _msg_handler(buffer : bytes, offset : int, result: MessageStore = None):
             if result is None:
-                result = list()
-
-            # if date is present check it first
-            if not date is None:
-                timestamp = struct.unpack_from('<I', buffer, offset)[0]
-                msg_date = datetime.fromtimestamp(timestamp, LOCAL_TZ)
-                days_delta = (msg_date - date).days
-                # skip iteration if message is from another date
-                if days_delta != 0:
-                    # return the list and only proceed if the msg_date is bigger than the filter_date
-                    return result, days_delta > 0
-                  
-            # read message and add to results
-            msg, _ = self.deserialize_message(buffer, offset)
-            result.insert(0, msg)
+                result = MessageStore(self.senders)
+            # collect the messages from newest to oldest, they are reversed at the end
+            result.append_serialized(buffer, offset)
             # return messages and continue as long as count is not satisfied
             return result, count == -1 or len(result) < count
         result = self._read_backlog(character, conversation_key, _msg_handler)
-        return [] if result is None else result
+        if result is None:
+            return MessageStore(self.senders)
+        result.reverse()
+        return result
+
+    def _get_backlog_of_day(self, character: str, conversation_key: str, count: int, date: datetime) -> MessageStore:
+        """Read the messages of a single day, seeking to it through the index"""
+        start_offset, end_offset = self.get_day_range(character, conversation_key, date)
+        day = LOCAL_OFFSETS.local_day(int(date.timestamp()))
+        result = MessageStore(self.senders)
+        try:
+            try:
+                records = list(self.iter_records(character, conversation_key, start_offset, end_offset))
+            except ValueError as e:
+                # index does not point to message boundaries, scan the whole file instead
+                print(f"Index of {character}/{conversation_key} is out of sync: {e}")
+                records = list(self.iter_records(character, conversation_key))
+
+            for record in records:
+                if LOCAL_OFFSETS.local_day(record.timestamp) == day:
+                    result.append_record(record)
+        except Exception as e:
+            print(f"Error reading backlog of {character}/{conversation_key}: {e}")
+            return MessageStore(self.senders)
+        return result if count == -1 else result[-count:]
+
+    def get_day_ranges(self, character: str, conversation_key: str, size: int) -> List[Tuple[int, int, int]]:
+        """Get (day, start offset, end offset) of every indexed day in file order
+
+        Only the first size bytes of the log are covered, messages in front of the
+        first indexed day belong to it. Empty for a log without index.
+        """
+        item = self.get_index(character).get(conversation_key.lower())
+        if item is None:
+            return []
+        starts = sorted((item.offsets[position], day) for day, position in item.index.items() if item.offsets[position] < size)
+        return [
+            (day, 0 if position == 0 else start, starts[position + 1][0] if position + 1 < len(starts) else size)
+            for position, (start, day) in enumerate(starts)
+        ]
+
+    def get_day_range(self, character: str, conversation_key: str, date: datetime) -> Tuple[int, Optional[int]]:
+        """Get the byte range of the log file that contains all messages of a date
+
+        The range is taken from the index and widened by one day on each side, so
+        index files written with a different timezone offset are still covered.
+
+        Returns:
+            Tuple of start offset and end offset (None for the end of the file)
+        """
+        item = self.get_index(character).get(conversation_key.lower())
+        if item is None or not item.index:
+            return 0, None
+
+        day = self.get_day(date)
+        days = sorted(item.index)
+        # last indexed day before the requested one
+        pos = bisect.bisect_left(days, day - 1)
+        if pos < len(days) and days[pos] == day - 1:
+            start_offset = item.offsets[item.index[days[pos]]]
+        elif pos > 0:
+            start_offset = item.offsets[item.index[days[pos - 1]]]
+        else:
+            start_offset = 0
+        # first indexed day after the requested one
+        pos = bisect.bisect_left(days, day + 2)
+        end_offset = item.offsets[item.index[days[pos]]] if pos < len(days) else None
+        return start_offset, end_offset
+
+    def read_page(self, character: str, conversation_key: str, cursor: Optional[int] = None, count: int = 100, before: bool = True) -> LogPage:
+        """Read up to count messages before or after a file offset
+
+        Args:
+            cursor: Offset of a message boundary, defaults to the end (before) or start (after) of the file
+            count: Maximum number of messages to read
+            before: Read the messages in front of the cursor instead of the ones after it
+
+        Raises:
+            ValueError: if the cursor does not point to a message boundary
+        """
+        file_path = self.get_log_file(character, conversation_key)
+        size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        if size == 0:
+            return LogPage(messages=[], start=0, end=0)
+
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if before:
+                end = size if cursor is None else min(cursor, size)
+                offsets = []
+                pos = end
+                # walk back using the size marker at the end of every message
+                while pos >= 2 and len(offsets) < count:
+                    size_marker = struct.unpack_from('<H', buffer, pos - 2)[0]
+                    msg_offset = pos - size_marker - 2
+                    if msg_offset < 0 or not self.validate_msg_size(buffer, msg_offset, size_marker):
+                        raise ValueError(f"msg_size and size_marker mismatch at offset {pos} of file {file_path}")
+                    offsets.append(msg_offset)
+                    pos = msg_offset
+                offsets.reverse()
+                return LogPage(
+                    messages=[self.deserialize_message(buffer, offset)[0] for offset in offsets],
+                    start=pos,
+                    end=end
+                )
+
+            start = 0 if cursor is None else cursor
+            messages = []
+            pos = start
+            while pos < size and len(messages) < count:
+                msg, msg_size = self.deserialize_message(buffer, pos)
+                messages.append(msg)
+                pos += msg_size
+            return LogPage(messages=messages, start=start, end=pos)
 
     def _read_backlog(self, character: str, conversation_key: str, handler : Callable) -> any:
         """Read through a log file backwards, processing messages with the given handler
@@ -339,94 +1073,142 @@ class ChatLogs:
             print(f"Error reading backlog of file {file_path}: {e}")
             return None
     
+    def iter_records(self, character: str, conversation_key: str, start_offset: int = 0, end_offset: int = None) -> Iterator[LogRecord]:
+        """Memory-map a log file and yield its records forwards without decoding them
+
+        Args:
+            character: Character name
+            conversation_key: Conversation identifier
+            start_offset: File offset of the first record to yield, must be a record boundary
+            end_offset: Stop before this file offset (defaults to the end of the file)
+
+        Raises:
+            ValueError: if a record is cut off or its size marker does not match
+        """
+        file_path = self.get_log_file(character, conversation_key)
+        if not os.path.exists(file_path):
+            return
+
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        buffer = memoryview(mapped)
+        try:
+            end = size if end_offset is None else min(end_offset, size)
+            offset = start_offset
+            while offset < end:
+                # we need the 6 byte prefix and the text length to know the record size
+                if offset + 6 > end or offset + 8 + buffer[offset + 5] > end:
+                    raise ValueError(f"Incomplete message at offset {offset} of file {file_path}")
+                name_len = buffer[offset + 5]
+                text_len = struct.unpack_from('<H', buffer, offset + 6 + name_len)[0]
+                msg_size = name_len + text_len + 10
+                if offset + msg_size > end:
+                    raise ValueError(f"Incomplete message at offset {offset} of file {file_path}")
+                if struct.unpack_from('<H', buffer, offset + msg_size - 2)[0] != msg_size - 2:
+                    raise ValueError(f"Invalid message size marker at offset {offset} of file {file_path}")
+                yield LogRecord(buffer, offset, msg_size)
+                offset += msg_size
+        finally:
+            # drop our reference so the mapping can be closed if no record is kept alive
+            buffer = None
+            try:
+                mapped.close()
+            except BufferError:
+                # records handed out are still referencing the mapping, it is closed once they are gone
+                pass
+
+    def iter_backlog(self, character: str, conversation_key: str) -> Iterator[Message]:
+        """Read through a log file forwards, yielding decoded messages in file order"""
+        for record in self.iter_records(character, conversation_key):
+            yield record.to_message(self.senders)
+
     def get_conversations(self, character: str) -> List[Tuple[str, str]]:
         """Get list of all conversations for a character"""
+        if self.manifest is not None:
+            return self.manifest.get_conversations(character)
         index = self.get_index(character)
-        return [(key, item.name) for key, item in index.items()]
+        return [(key, index.get_name(key)) for key in index]
 
     def get_available_characters(self) -> List[str]:
         """Get list of all characters with logs"""
         os.makedirs(self.log_directory, exist_ok=True)
+        if self.manifest is not None:
+            return self.manifest.get_characters()
         return [
             name for name in os.listdir(self.log_directory)
             if os.path.isdir(os.path.join(self.log_directory, name))
         ]
 
-    def fix_logs(self, character: str) -> None:
-        """Fix corrupted log files and their indices"""
+    def fix_logs(self, character: str, max_workers: Optional[int] = None,
+                 progress: Optional[Callable[[RepairResult, int, int], None]] = None, verbose: bool = True,
+                 salvage: bool = False, quarantine_dir: Optional[str] = None) -> RepairReport:
+        """Fix corrupted log files and their indices
+
+        By default every log is cut at its first broken record. With salvage the
+        repair continues at the next plausible record instead, so only the damaged
+        bytes are removed. Either way every log gets its index rebuilt. Logs are
+        repaired in parallel on a process pool, index files without a log are
+        deleted.
+
+        Args:
+            max_workers: Number of worker processes, defaults to the number of CPUs
+            progress: Called with (result, done, total) after every repaired log
+            verbose: Print the report
+            salvage: Keep the records behind damaged bytes, only the damaged bytes are removed
+            quarantine_dir: Where the removed bytes are kept, defaults to quarantine/<timestamp> when salvaging
+
+        Returns:
+            Report with the result of every log
+        """
         dir_path = self.get_log_dir(character)
-        files = os.listdir(dir_path)
-        buffer = bytearray(50100)
-        
-        for file in files:
-            full_path = os.path.join(dir_path, file)
-            
-            # Handle index files
+        report = RepairReport(character)
+        start = time.perf_counter()
+        files = set(os.listdir(dir_path))
+        keys = []
+        for file in sorted(files):
             if file.endswith('.idx'):
-                log_path = full_path[:-4]  # Remove .idx
-                if not os.path.exists(log_path):
-                    os.unlink(full_path)
-                continue
-                
-            # Open log file
-            try:
-                with open(full_path, 'rb+') as fd:
-                    index_path = f"{full_path}.idx"
-                    if not os.path.exists(index_path):
-                        os.unlink(full_path)
-                        continue
-                        
-                    with open(index_path, 'rb+') as index_fd:
-                        # Read name length and content
-                        index_fd.readinto(memoryview(buffer)[:1])
-                        pos = 0
-                        last_day = 0
-                        name_end = buffer[0] + 1
-                        
-                        # Truncate index to name section
-                        index_fd.truncate(name_end)
-                        index_fd.seek(0)
-                        index_fd.readinto(memoryview(buffer)[:name_end])
-                        
-                        # Get file size
-                        fd.seek(0, os.SEEK_END)
-                        size = fd.tell()
-                        
-                        try:
-                            while pos < size:
-                                buffer[50100:] = [-1] * (len(buffer) - 50100)
-                                fd.seek(pos)
-                                fd.readinto(memoryview(buffer)[:50100])
-                                
-                                # Create dummy character for deserialization
-                                def char_getter(name: str) -> Character:
-                                    return Character(name=name)
-                                
-                                msg, msg_size = self.deserialize_message(buffer, 0)
-                                time = msg.time
-                                day = int(time.timestamp() * 1000 / DAY_MS - time.utcoffset().total_seconds() / 60 / 1440)
-                                
-                                if day > last_day:
-                                    # Write new index entry
-                                    struct.pack_into('<H', buffer, 0, day)
-                                    for i in range(5):
-                                        buffer[2 + i] = (pos >> (i * 8)) & 0xFF
-                                    index_fd.write(buffer[:7])
-                                    last_day = day
-                                
-                                # Verify message size marker
-                                if struct.unpack_from('<H', buffer, msg_size - 2)[0] != msg_size - 2:
-                                    raise ValueError("Invalid message size marker")
-                                    
-                                pos += msg_size
-                                
-                        except Exception as e:
-                            print(f"Error fixing log {file}: {e}")
-                            fd.truncate(pos)
-                            
-            except Exception as e:
-                print(f"Error opening files for {file}: {e}")
-                continue
+                if file[:-4] not in files:
+                    os.unlink(os.path.join(dir_path, file))
+                    report.removed.append(file)
+            elif not file.endswith('.tmp'):
+                keys.append(file)
+
+        if salvage and quarantine_dir is None:
+            quarantine_dir = os.path.join("quarantine", datetime.now().strftime("%Y%m%d_%H%M%S"))
+
+        jobs = [(self.log_directory, character, key, salvage, quarantine_dir) for key in keys]
+        for _, result in map_processes(_repair_log, jobs, max_workers):
+            report.results.append(result())
+            if progress is not None:
+                progress(report.results[-1], len(report.results), len(keys))
+        report.results.sort(key=lambda result: result.key)
+        report.duration = time.perf_counter() - start
+
+        # the cached index of the character no longer matches the files
+        with self._index_lock:
+            self.indices.pop(character, None)
+
+        if verbose:
+            self._print_repair_report(report)
+        return report
+
+    def _print_repair_report(self, report: RepairReport) -> None:
+        for result in report.results:
+            if result.error is not None:
+                print(f"Error fixing log {result.key}: {result.error}")
+            elif result.truncated:
+                print(f"Fixed log {result.key}: {result.damage}, kept {result.records} messages, "
+                      f"removed {result.file_size - result.valid_size} bytes in {len(result.removed)} places")
+            elif result.index_rewritten:
+                print(f"Fixed index of {result.key}: {result.records} messages")
+        for file in report.removed:
+            print(f"Removed index {file} without log")
+        print(f"Checked {len(report.results)} logs of {report.character} in {report.duration:.2f}s: "
+              f"{len(report.repaired)} repaired, {len(report.failed)} failed")
 
     def log_message(self, account, conversation, messages: Union[Message, List[Message]]) -> None:
         """Write one or multiple messages to the log file
@@ -435,44 +1217,90 @@ class ChatLogs:
             conversation: Dict with 'key' and 'name' of the conversation
             messages: Single message or list of messages to write
         """
-        file_path = self.get_log_file(account, conversation[0])
-        
         # Convert single message to list
         if not isinstance(messages, list):
             messages = [messages]
-            
-        # Get current file size for index
-        current_size = os.path.exists(file_path) and os.path.getsize(file_path) or 0
-        # Process all messages
+
+        with self.open_writer(account, conversation) as writer:
+            writer.write_all(messages)
+
+    def open_writer(self, account: str, conversation) -> "LogWriter":
+        """Open a buffered writer that appends to a conversation log and its index
+
+        Args:
+            account: Character name
+            conversation: Key and name of the conversation
+        """
+        return LogWriter(self, account, conversation)
+
+class LogWriter:
+    """Appends messages to a conversation log with a single buffered file handle
+
+    Index entries are collected in memory and appended to the index file on close.
+    Use as a context manager.
+    """
+    def __init__(self, chat_logs: ChatLogs, account: str, conversation):
+        self.chat_logs = chat_logs
+        self.account = account
+        self.key = conversation[0]
+        self.name = conversation[1]
+        self.file_path = chat_logs.get_log_file(account, self.key)
+
+        # 'a' to append if an index exists, 'x' to create a new one if it doesn't
+        self.index = chat_logs.get_index(account)
+        self.has_index = self.key in self.index
+        self.index_buffer = bytearray()
+        self.file = open(self.file_path, 'ab', buffering=1 << 20)
+        self.size = self.file.tell()
+
+    def __enter__(self) -> "LogWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def write(self, message: Message) -> None:
+        """Serialize and append a single message"""
+        buffer, _ = self.chat_logs.serialize_message(message)
+        self._append(self.chat_logs.get_day(message.time), buffer)
+
+    def write_record(self, record: LogRecord) -> None:
+        """Append an already serialized record without decoding it"""
+        self._append(self.chat_logs.get_day_of_timestamp(record.timestamp), record.raw)
+
+    def write_all(self, messages: Iterable[Union[Message, LogRecord]]) -> int:
+        """Append all messages or records and return how many were written"""
+        count = 0
         for message in messages:
-            # Serialize message
-            buffer, _ = self.serialize_message(message)
-            index = self.get_index(account)
-            # Check and update index
-            has_index = conversation[0] in index
-            index_buffer = self.check_index(
-                message, 
-                conversation[0], 
-                conversation[1],
-                current_size
-            )
-            
-            # Write index if needed
-            if index_buffer is not None:
-                index_path = f"{file_path}.idx"
-                # 'a' to append if exists, 'wx' to create new if doesn't exist
-                with open(index_path, 'ab' if has_index else 'xb') as f:
-                    f.write(index_buffer)
-            
-            # Write message
-            with open(file_path, 'ab') as f:
-                f.write(buffer)
-                
-            # Update size for next message
-            current_size += len(buffer)
+            if isinstance(message, LogRecord):
+                self.write_record(message)
+            else:
+                self.write(message)
+            count += 1
+        return count
+
+    def _append(self, day: int, buffer) -> None:
+        # the index item lives in the ChatLogs object, so it stays up to date for later writes
+        index_buffer = self.chat_logs.check_index_day(day, self.key, self.name, self.size, self.index)
+        if index_buffer is not None:
+            self.index_buffer += index_buffer
+        self.file.write(buffer)
+        self.size += len(buffer)
+
+    def close(self) -> None:
+        """Flush the log and write the collected index entries"""
+        if self.file.closed:
+            return
+        self.file.close()
+        if self.index_buffer:
+            with open(f"{self.file_path}.idx", 'ab' if self.has_index else 'xb') as f:
+                f.write(self.index_buffer)
+            self.has_index = True
+            self.index_buffer = bytearray()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="F-Chat Database Inspector ")
+    parser.add_argument('-p', '--path', required=True, help='Data-Folder of the F-Chat installation')
     parser.add_argument('-a', '--account', help='Account to get Logfiles for')
     parser.add_argument('-c', '--conversation',  help='Conversation to read from')
     parser.add_argument('-d', '--dump', type=int, help='Dump contents of a specific log entry (0-based index)')
@@ -481,16 +1309,17 @@ if __name__ == "__main__":
     
     if not args.account:
         parser.error("Please specify an account name with -a")
-        exit
         
-    chat_logs = ChatLogs()
+    chat_logs = ChatLogs(args.path)
     if not args.conversation:
         conversations = chat_logs.get_conversations(args.account) 
         for conversation in conversations:
             print(conversation)
-        exit
-    
-    messages = chat_logs.get_backlog(args.account, args.conversation)
-    for message in messages:
-        print(message)
-    exit
\ No newline at end of file
+    elif args.dump is not None:
+        for position, record in enumerate(chat_logs.iter_records(args.account, args.conversation)):
+            if position == args.dump:
+                print(f"offset {record.offset}, size {record.size}: {record.to_message()}")
+                break
+    else:
+        for message in chat_logs.iter_backlog(args.account, args.conversation):
+            print(message)
@@ -15,8 +15,11 @@ class Localization:
                 "both_devices": "Both Databases",
                 "device_a_only": "Database A Only",
                 "device_b_only": "Database B Only",
+                "incremental_merge": "Only Append Missing Messages",
                 "view_selected": "View Selected",
                 "merge_selected": "Merge Selected",
+                "merge_all_different": "Merge All Different",
+                "scan_progress": "Scanning {done}/{total}",
                 
                 # Context menu
                 "view_conversation": "View Conversation",
@@ -43,6 +46,19 @@ class Localization:
                 "next_diff": "⬇ Next",
                 "change_blocks": "Change Blocks: {current}/{total}",
                 
+                # Search panel
+                "search_title": "Search - {account}",
+                "search_button": "🔍 Search",
+                "search_regex": "Regular Expression",
+                "search_case_sensitive": "Case Sensitive",
+                "search_time_column": "Time",
+                "search_sender_column": "Sender",
+                "search_text_column": "Message",
+                "search_progress": "Searching {done}/{total}",
+                "search_done_msg": "{hits} message(s) found in {files} conversation(s) in {seconds:.2f}s",
+                "search_failed_msg": "Search failed: {error}",
+                "diff_failed_msg": "Failed to compare the logs: {error}",
+                
                 # Messages
                 "no_selection": "No Selection",
                 "select_conversation": "Please select at least one conversation to merge",
@@ -50,6 +66,11 @@ class Localization:
                 "merge_error_msg": "Failed to merge conversation {conversation}: {error}",
                 "merge_success": "Success",
                 "merge_success_msg": "Successfully merged {count} conversation(s)",
+                "merge_throughput_msg": "{messages} messages in {seconds:.1f}s ({rate:.0f} messages/s)",
+                "merge_batch_error_msg": "Failed to merge {failed} of {total} conversation(s):\n{details}",
+                "merge_progress": "Merging {done}/{total}",
+                "merge_failed_msg": "Merge failed: {error}",
+                "nothing_to_merge": "All conversations are identical, nothing to merge",
                 "load_error": "Error",
                 "load_error_msg": "Failed to load databases: {error}",
                 "select_paths": "Please select both database paths"
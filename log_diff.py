@@ -0,0 +1,138 @@
+import os
+import mmap
+from array import array
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from fchat_logs import ChatLogs, Message, map_log
+
+@dataclass
+class DiffHunk:
+    """A run of days that is either identical on both devices or differs"""
+    equal: bool
+    days: List[int]
+    range_a: Tuple[int, int]  # byte range in the log of device A
+    range_b: Tuple[int, int]  # byte range in the log of device B
+    # aligned (offset in A, offset in B) record pairs, only filled for differing hunks
+    rows: List[Tuple[Optional[int], Optional[int]]] = field(default_factory=list)
+
+def _get_day_ranges(db: ChatLogs, account: str, key: str, size: int) -> Dict[Optional[int], Tuple[int, int]]:
+    """Get the byte range of every indexed day, a log without index is one range under None"""
+    ranges = db.get_day_ranges(account, key, size)
+    if not ranges:
+        return {None: (0, size)} if size > 0 else {}
+    return {day: (start, end) for day, start, end in ranges}
+
+def _align(db_a: ChatLogs, db_b: ChatLogs, account: str, key: str, range_a: Tuple[int, int], range_b: Tuple[int, int]) -> List[Tuple[Optional[int], Optional[int]]]:
+    """Pair up identical records of both byte ranges ordered by time"""
+    map_a = {(record.timestamp, bytes(record.raw)): record.offset for record in db_a.iter_records(account, key, *range_a)}
+    map_b = {(record.timestamp, bytes(record.raw)): record.offset for record in db_b.iter_records(account, key, *range_b)}
+    return [(map_a.get(row_key), map_b.get(row_key)) for row_key in sorted(map_a.keys() | map_b.keys())]
+
+def diff_conversation(db_a: ChatLogs, db_b: ChatLogs, account: str, key: str) -> List[DiffHunk]:
+    """Compare a conversation of both devices day by day
+
+    Days with byte-identical content are only compared, never decoded. Consecutive
+    differing days are aligned together, so messages that ended up in neighbouring
+    days (e.g. because of index files written in another timezone) still match.
+    """
+    path_a = db_a.get_log_file(account, key)
+    path_b = db_b.get_log_file(account, key)
+    hunks: List[DiffHunk] = []
+
+    with map_log(path_a) as log_a, map_log(path_b) as log_b:
+        days_a = _get_day_ranges(db_a, account, key, len(log_a))
+        days_b = _get_day_ranges(db_b, account, key, len(log_b))
+        # logs without index are compared as a whole
+        if None in days_a or None in days_b:
+            days_a = {None: (0, len(log_a))}
+            days_b = {None: (0, len(log_b))}
+
+        for day in sorted(days_a.keys() | days_b.keys(), key=lambda day: -1 if day is None else day):
+            start_a, end_a = days_a.get(day, (None, None))
+            start_b, end_b = days_b.get(day, (None, None))
+            equal = (start_a is not None and start_b is not None and end_a - start_a == end_b - start_b
+                     and log_a[start_a:end_a] == log_b[start_b:end_b])
+
+            last = hunks[-1] if hunks else None
+            if start_a is None:
+                start_a = end_a = last.range_a[1] if last else 0
+            if start_b is None:
+                start_b = end_b = last.range_b[1] if last else 0
+
+            # extend the previous hunk if it is of the same kind and directly in front
+            if last is not None and last.equal == equal and last.range_a[1] == start_a and last.range_b[1] == start_b:
+                last.days.append(day)
+                last.range_a = (last.range_a[0], end_a)
+                last.range_b = (last.range_b[0], end_b)
+            else:
+                hunks.append(DiffHunk(equal, [day], (start_a, end_a), (start_b, end_b)))
+
+    for hunk in hunks:
+        if not hunk.equal:
+            hunk.rows = _align(db_a, db_b, account, key, hunk.range_a, hunk.range_b)
+    return hunks
+
+class DiffModel:
+    """Line by line alignment of a conversation on both devices
+
+    Only the record offsets of every line are kept, messages are decoded when a
+    line is requested. Call close() to release the mapped log files.
+    """
+    def __init__(self, db_a: ChatLogs, db_b: ChatLogs, account: str, key: str):
+        self.db_a = db_a
+        self.db_b = db_b
+        # record offset of every line, -1 where the device lacks the message
+        self.offsets_a = array('q')
+        self.offsets_b = array('q')
+        # (first line, last line) of every run of lines missing on one side
+        self.blocks: List[Tuple[int, int]] = []
+
+        for hunk in diff_conversation(db_a, db_b, account, key):
+            if hunk.equal:
+                shift = hunk.range_b[0] - hunk.range_a[0]
+                for record in db_a.iter_records(account, key, *hunk.range_a):
+                    self.offsets_a.append(record.offset)
+                    self.offsets_b.append(record.offset + shift)
+            else:
+                for offset_a, offset_b in hunk.rows:
+                    self.offsets_a.append(-1 if offset_a is None else offset_a)
+                    self.offsets_b.append(-1 if offset_b is None else offset_b)
+        self._find_blocks()
+
+        self.log_a = self._map(db_a.get_log_file(account, key))
+        self.log_b = self._map(db_b.get_log_file(account, key))
+
+    def _map(self, file_path: str) -> Optional[mmap.mmap]:
+        if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+            return None
+        with open(file_path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _find_blocks(self) -> None:
+        block_start = None
+        for line in range(len(self)):
+            if self.offsets_a[line] < 0 or self.offsets_b[line] < 0:
+                if block_start is None:
+                    block_start = line
+            elif block_start is not None:
+                self.blocks.append((block_start, line - 1))
+                block_start = None
+        if block_start is not None:
+            self.blocks.append((block_start, len(self) - 1))
+
+    def __len__(self) -> int:
+        return len(self.offsets_a)
+
+    def get_line(self, line: int) -> Tuple[Optional[Message], Optional[Message]]:
+        """Decode the messages of both devices shown on a line"""
+        offset_a = self.offsets_a[line]
+        offset_b = self.offsets_b[line]
+        msg_a = None if offset_a < 0 else self.db_a.deserialize_message(self.log_a, offset_a)[0]
+        msg_b = None if offset_b < 0 else self.db_b.deserialize_message(self.log_b, offset_b)[0]
+        return msg_a, msg_b
+
+    def close(self) -> None:
+        for mapped in (self.log_a, self.log_b):
+            if mapped is not None:
+                mapped.close()
+        self.log_a = self.log_b = None
@@ -0,0 +1,129 @@
+import os
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from fchat_logs import ChatLogs
+from summary_cache import ConversationSummary, SummaryCache
+
+@dataclass
+class LogChange:
+    """A conversation log that changed on disk"""
+    db: ChatLogs
+    account: str
+    key: str
+    previous_size: int  # 0 for a new log
+    size: int
+    # with a summary cache: summaries of the conversation on all watched databases, in the order given to watch()
+    summaries: List[Optional[ConversationSummary]] = field(default_factory=list)
+
+    @property
+    def appended(self) -> bool:
+        """Whether the log only grew, otherwise it was replaced or truncated"""
+        return self.size > self.previous_size
+
+class LogWatcher:
+    """Polls the logs directories of an account and reports changed log files
+
+    Runs on its own thread, changes are collected with poll(). With a summary
+    cache, the summaries of a changed conversation on all watched databases are
+    brought up to date on the watcher thread, so the UI thread never scans a log.
+    For the changed log only the appended bytes are scanned.
+    """
+    def __init__(self, summary_cache: Optional[SummaryCache] = None, interval: float = 1.0):
+        self.summary_cache = summary_cache
+        self.interval = interval
+        self.changes: "queue.Queue[LogChange]" = queue.Queue()
+        self._targets: List[Tuple[ChatLogs, str, Optional[List[str]]]] = []
+        self._files: Dict[str, Tuple[int, float]] = {}  # log path -> (size, mtime)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="log-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def watch(self, account: str, dbs: List[ChatLogs], keys: Optional[List[str]] = None) -> None:
+        """Watch the logs of an account on the given databases instead of the previous ones
+
+        Args:
+            keys: Only watch these conversations, defaults to all
+        """
+        targets = [(db, account, None if keys is None else [key.lower() for key in keys]) for db in dbs]
+        files = {}
+        for target in targets:
+            files.update(self._list(*target))
+        with self._lock:
+            self._targets = targets
+            self._files = files
+            # changes of the previous account are no longer of interest
+            while True:
+                try:
+                    self.changes.get_nowait()
+                except queue.Empty:
+                    break
+
+    def poll(self) -> List[LogChange]:
+        """Get all changes detected since the last call"""
+        changes = []
+        while True:
+            try:
+                changes.append(self.changes.get_nowait())
+            except queue.Empty:
+                return changes
+
+    def _list(self, db: ChatLogs, account: str, keys: Optional[List[str]]) -> Dict[str, Tuple[int, float]]:
+        """Stat all log files of an account in one directory pass"""
+        files = {}
+        dir_path = os.path.join(db.log_directory, account, "logs")
+        try:
+            for entry in os.scandir(dir_path):
+                if entry.name.endswith('.idx') or (keys is not None and entry.name.lower() not in keys):
+                    continue
+                stat = entry.stat()
+                files[entry.path] = (stat.st_size, stat.st_mtime)
+        except OSError:
+            pass
+        return files
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Error watching logs: {e}")
+
+    def check(self) -> None:
+        """Compare all watched logs with their last known state and report the changed ones"""
+        with self._lock:
+            targets = list(self._targets)
+        for db, account, keys in targets:
+            for path, (size, mtime) in self._list(db, account, keys).items():
+                with self._lock:
+                    if self._targets != targets:
+                        # watch() was called in the meantime
+                        return
+                    previous = self._files.get(path)
+                    if previous == (size, mtime):
+                        continue
+                    self._files[path] = (size, mtime)
+                key = os.path.basename(path)
+                change = LogChange(db, account, key, 0 if previous is None else previous[0], size)
+                if self.summary_cache is not None:
+                    try:
+                        change.summaries = [self.summary_cache.get(target[0], account, key) for target in targets]
+                    except Exception as e:
+                        print(f"Error scanning {account}/{key}: {e}")
+                        # report the change again on the next check
+                        with self._lock:
+                            if previous is None:
+                                self._files.pop(path, None)
+                            else:
+                                self._files[path] = previous
+                        continue
+                self.changes.put(change)
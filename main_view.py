@@ -1,15 +1,26 @@
 import os
+import queue
+import threading
+import multiprocessing
 import tkinter as tk
 from tkinter import ttk, messagebox
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 import json
 from diff_viewer import DiffViewer
+from search_panel import SearchPanel
 from settings_dialog import SettingsDialog
 from data_merge import DataMerger, MergeConfig
 from fchat_logs import ChatLogs
+from summary_cache import SummaryCache
+from manifest_cache import ManifestCache
+from log_watcher import LogWatcher
+from conversation_scanner import ConversationScanner, ConversationStatus, union_conversations
 from localization import L10N
 
+# how often the logs of the selected account are checked for changes
+WATCH_INTERVAL_MS = 1000
+
 class ChatLogMerger(ttk.Window):
     def __init__(self):
         super().__init__(themename="darkly")
@@ -19,6 +30,18 @@ class ChatLogMerger(ttk.Window):
         
         # Config path
         self.config_path = os.path.expanduser("~/.fchat_merger/config.json")
+        self.summary_cache = SummaryCache(os.path.expanduser("~/.fchat_merger/summary_cache.json"))
+        self.manifest_a = None
+        self.manifest_b = None
+        
+        # Background scanning of the conversation list
+        self.scanner = ConversationScanner(self.summary_cache)
+        self.scan_job = None
+        self.scan_rows = {}
+        self.merge_thread = None
+        
+        # Logs that F-Chat appends to while the merger is open
+        self.watcher = LogWatcher(self.summary_cache)
         
         # Initialize merger
         self.merger = DataMerger()
@@ -29,6 +52,25 @@ class ChatLogMerger(ttk.Window):
         
         self._create_ui()
         self._load_accounts()
+        self.watcher.start()
+        self.after(WATCH_INTERVAL_MS, self._poll_watcher)
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        
+    def _on_close(self):
+        """Stop background work before closing the window"""
+        if self.scan_job is not None:
+            self.scan_job.cancel()
+        self.scanner.shutdown()
+        self.watcher.stop()
+        self._save_caches()
+        self.destroy()
+        
+    def _save_caches(self):
+        """Write summary cache and manifests to disk"""
+        self.summary_cache.save()
+        for manifest in (self.manifest_a, self.manifest_b):
+            if manifest is not None:
+                manifest.save()
         
     def _create_ui(self):
         """Create the main UI"""
@@ -117,6 +159,14 @@ class ChatLogMerger(ttk.Window):
             variable=self.target_var
         ).pack(side=tk.LEFT)
         
+        # Append only the missing tail when one log is a prefix of the other
+        self.incremental_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            options_frame,
+            text=L10N.get_text("incremental_merge"),
+            variable=self.incremental_var
+        ).pack(side=tk.RIGHT)
+        
         # Action buttons
         btn_frame = ttk.Frame(main_container)
         btn_frame.pack(fill=tk.X, pady=(10, 0))
@@ -128,6 +178,13 @@ class ChatLogMerger(ttk.Window):
             style="info.TButton"
         ).pack(side=tk.LEFT)
         
+        ttk.Button(
+            btn_frame,
+            text=L10N.get_text("search_button"),
+            command=self._open_search,
+            style="info.Outline.TButton"
+        ).pack(side=tk.LEFT, padx=(10, 0))
+        
         ttk.Button(
             btn_frame,
             text=L10N.get_text("merge_selected"),
@@ -135,6 +192,19 @@ class ChatLogMerger(ttk.Window):
             style="success.TButton"
         ).pack(side=tk.RIGHT)
         
+        ttk.Button(
+            btn_frame,
+            text=L10N.get_text("merge_all_different"),
+            command=lambda: self._merge_all_different(),
+            style="success.Outline.TButton"
+        ).pack(side=tk.RIGHT, padx=(0, 10))
+        
+        # Scan progress
+        self.scan_label = ttk.Label(btn_frame, text="")
+        self.scan_label.pack(side=tk.LEFT, padx=(10, 5))
+        self.scan_progress = ttk.Progressbar(btn_frame, mode="determinate", length=150)
+        self.scan_progress.pack(side=tk.LEFT)
+        
     def _load_config(self):
         """Load config from file"""
         if os.path.exists(self.config_path):
@@ -161,8 +231,10 @@ class ChatLogMerger(ttk.Window):
     def _load_accounts(self):
         """Load accounts from databases"""
         try:
-            self.device_a_db = ChatLogs(self.device_a_path)
-            self.device_b_db = ChatLogs(self.device_b_path)
+            self.manifest_a = ManifestCache(self.device_a_path)
+            self.manifest_b = ManifestCache(self.device_b_path)
+            self.device_a_db = ChatLogs(self.device_a_path, self.manifest_a)
+            self.device_b_db = ChatLogs(self.device_b_path, self.manifest_b)
             
             # Get unique accounts from both devices
             accounts = sorted(set(self.device_a_db.get_available_characters()) | set(self.device_b_db.get_available_characters()))
@@ -176,65 +248,114 @@ class ChatLogMerger(ttk.Window):
             messagebox.showerror("Error", f"Failed to load databases: {str(e)}")
             
     def _load_conversations(self):
-        """Load conversations for selected account"""
+        """Load conversations for selected account and scan them in the background"""
+        # results of a previous account are no longer needed
+        if self.scan_job is not None:
+            self.scan_job.cancel()
+            self.scan_job = None
         self.tree.delete(*self.tree.get_children())
+        self.scan_rows = {}
         account = self.account_combo.get()
         
+        # changes from here on are reported by the watcher, the scan covers everything before
+        self.watcher.watch(account, [self.device_a_db, self.device_b_db] if account else [])
         if not account:
+            self._update_scan_progress(None)
             return
             
-        # Get conversations from both devices
-        convos_a = set(self.device_a_db.get_conversations(account))
-        convos_b = set(self.device_b_db.get_conversations(account))
-        
-        # Add all conversations to tree
-        for convo in sorted(convos_a | convos_b):
-            in_a = convo in convos_a
-            in_b = convo in convos_b
-            conversation_key = convo[0]
-            size_a = self.device_a_db.get_backlog_size(account, conversation_key)
-            if size_a > 0:
-                lastlog_a = self.device_a_db.get_backlog(account, conversation_key, 1)[0]
-            else:
-                lastlog_a = None
-            size_b = self.device_b_db.get_backlog_size(account, conversation_key)
-            if size_b > 0:
-                lastlog_b = self.device_b_db.get_backlog(account, conversation_key, 1)[0]
-            else:
-                lastlog_b = None
-            
-            if size_a != size_b:
-                different = False
-                if lastlog_a is None:
-                    if lastlog_b:
-                        different = True 
-                    device_a = f"{size_a}"
-                else:
-                    if lastlog_b and lastlog_a.time != lastlog_b.time:
-                        different = True 
-                    device_a = f"{size_a} ({lastlog_a.time})"
-                if lastlog_b is None:
-                    if lastlog_a:
-                        different = True 
-                    device_b = f"{size_b}"
-                else:
-                    if lastlog_a and lastlog_a.time != lastlog_b.time:
-                        different = True 
-                    device_b = f"{size_b} ({lastlog_b.time})"
-            
-            self.tree.insert(
+        # Get conversations from both devices, the manifests know which logs changed since the last run
+        self.manifest_a.check_files(account)
+        self.manifest_b.check_files(account)
+        conversations = union_conversations(
+            self.device_a_db.get_conversations(account),
+            self.device_b_db.get_conversations(account)
+        )
+        
+        # Add all conversations to tree with the counts of the last run, they are updated once scanned
+        for convo in conversations:
+            self.scan_rows[convo] = self.tree.insert(
                 "",
                 "end",
                 text=f"{convo[1]} ({convo[0]})",
                 values=(
                     f"{convo[1]} ({convo[0]})",
-                    size_a,
-                    size_b,
+                    self.manifest_a.get_stats(account, convo[0]).get("count", "…"),
+                    self.manifest_b.get_stats(account, convo[0]).get("count", "…"),
                     convo[0],
                     convo[1]
                 ),
-                tags=('different',) if different else ('common',)
+                tags=('common',)
             )
+        
+        self.scan_job = self.scanner.start(self.device_a_db, self.device_b_db, account, conversations)
+        self._update_scan_progress(self.scan_job)
+        self.after(50, self._poll_scan, self.scan_job)
+        
+    def _poll_scan(self, job):
+        """Move finished scan results into the conversation list"""
+        if job is not self.scan_job:
+            return
+            
+        for status in job.poll():
+            self._update_row(status)
+        self._update_scan_progress(job)
+        
+        if job.finished:
+            self.scan_job = None
+            self._save_caches()
+        else:
+            self.after(50, self._poll_scan, job)
+            
+    def _poll_watcher(self):
+        """Update the rows of conversations whose logs changed on disk"""
+        changes = self.watcher.poll()
+        # merges rewrite the logs, the list is reloaded once they are done
+        if changes and (self.merge_thread is None or not self.merge_thread.is_alive()):
+            account = self.account_combo.get()
+            names = {convo_key: name for convo_key, name in self.scan_rows}
+            for change in changes:
+                if change.account != account:
+                    continue
+                key = change.key.lower()
+                name = names.get(key)
+                if name is None:
+                    # a new conversation, list it with the others
+                    self._load_conversations()
+                    break
+                # the watcher computed the summaries of both devices in the order given to watch()
+                summary_a, summary_b = change.summaries
+                self._update_row(ConversationStatus(key, name, summary_a, summary_b))
+        self.after(WATCH_INTERVAL_MS, self._poll_watcher)
+        
+    def _update_row(self, status: ConversationStatus):
+        """Show the scan result of a conversation in its tree row"""
+        account = self.account_combo.get()
+        for manifest, summary in ((self.manifest_a, status.summary_a), (self.manifest_b, status.summary_b)):
+            if summary is not None:
+                manifest.update_stats(account, status.key, summary.file_size, summary.mtime, count=summary.count)
+        item = self.scan_rows.get((status.key, status.name))
+        if item is None or not self.tree.exists(item):
+            return
+        self.tree.item(
+            item,
+            values=(
+                f"{status.name} ({status.key})",
+                status.count_a,
+                status.count_b,
+                status.key,
+                status.name
+            ),
+            tags=('different',) if status.different else ('common',)
+        )
+        
+    def _update_scan_progress(self, job):
+        """Update progress bar and label of the background scan"""
+        if job is None or job.finished:
+            self.scan_label.configure(text="")
+            self.scan_progress.configure(value=0)
+            return
+        self.scan_label.configure(text=L10N.get_text("scan_progress", done=job.done, total=job.total))
+        self.scan_progress.configure(maximum=max(job.total, 1), value=job.done)
             
     def _show_context_menu(self, event):
         """Show context menu for tree item"""
@@ -281,6 +402,21 @@ class ChatLogMerger(ttk.Window):
             self.device_b_db
         )
         
+    def _open_search(self):
+        """Open the search panel for the selected account"""
+        account = self.account_combo.get()
+        if not account:
+            return
+            
+        SearchPanel(
+            self,
+            {
+                L10N.get_text("data_a_frame"): self.device_a_path,
+                L10N.get_text("data_b_frame"): self.device_b_path
+            },
+            account
+        )
+        
     def _merge_selected(self, target=None):
         """Merge selected conversations"""
         selected = self.tree.selection()
@@ -290,41 +426,106 @@ class ChatLogMerger(ttk.Window):
                 L10N.get_text("select_conversation")
             )
             return
+        self._merge_items(selected, target)
+        
+    def _merge_all_different(self, target=None):
+        """Merge every conversation that differs between the devices"""
+        different = [item for item in self.tree.get_children() if 'different' in self.tree.item(item)["tags"]]
+        if not different:
+            messagebox.showinfo(
+                L10N.get_text("merge_success"),
+                L10N.get_text("nothing_to_merge")
+            )
+            return
+        self._merge_items(different, target)
+        
+    def _merge_items(self, items, target=None):
+        """Merge the conversations of the given tree items in the background"""
+        if self.merge_thread is not None and self.merge_thread.is_alive():
+            return
             
         account = self.account_combo.get()
         # Use provided target or fallback to radio button selection
         target = target or self.target_var.get()
         
-        for item in selected:
-            conversation = [  self.tree.item(item)["values"][3],  self.tree.item(item)["values"][4]]
-            
-            # Create merge config
-            config = MergeConfig(
+        configs = [
+            MergeConfig(
                 account=account,
-                conversation=conversation,
+                conversation=[self.tree.item(item)["values"][3], self.tree.item(item)["values"][4]],
                 device_a_path=self.device_a_path,
                 device_b_path=self.device_b_path,
-                target=target
+                target=target,
+                incremental=self.incremental_var.get()
             )
+            for item in items
+        ]
+        
+        # the list is rescanned once the merge is done
+        if self.scan_job is not None:
+            self.scan_job.cancel()
+            self.scan_job = None
             
-            # Perform merge
+        progress = queue.Queue()
+        self.merge_thread = threading.Thread(target=self._run_merge, args=(configs, progress), daemon=True)
+        self.merge_thread.start()
+        self.after(100, self._poll_merge, progress)
+        
+    def _run_merge(self, configs, progress):
+        """Run a batch merge, called on the merge thread"""
+        try:
+            report = self.merger.merge_conversations(
+                configs,
+                progress=lambda result, done, total: progress.put((done, total))
+            )
+        except Exception as e:
+            report = e
+        progress.put(report)
+        
+    def _poll_merge(self, progress):
+        """Show merge progress and the final report"""
+        report = None
+        while True:
             try:
-                self.merger.merge_conversation(config)
-            except Exception as e:
-                messagebox.showerror(
-                    L10N.get_text("merge_error"),
-                    L10N.get_text("merge_error_msg", conversation=conversation, error=str(e))
-                )
-                return
-        
-        messagebox.showinfo(
-            L10N.get_text("merge_success"),
-            L10N.get_text("merge_success_msg", count=len(selected))
-        )
+                update = progress.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(update, tuple):
+                done, total = update
+                self.scan_label.configure(text=L10N.get_text("merge_progress", done=done, total=total))
+                self.scan_progress.configure(maximum=max(total, 1), value=done)
+            else:
+                report = update
+                
+        if report is None:
+            self.after(100, self._poll_merge, progress)
+            return
+            
+        if isinstance(report, Exception):
+            messagebox.showerror(
+                L10N.get_text("merge_error"),
+                L10N.get_text("merge_failed_msg", error=str(report))
+            )
+        elif report.failed:
+            details = "\n".join(
+                L10N.get_text("merge_error_msg", conversation=result.config.conversation, error=result.error)
+                for result in report.failed[:10]
+            )
+            messagebox.showerror(
+                L10N.get_text("merge_error"),
+                L10N.get_text("merge_batch_error_msg", failed=len(report.failed), total=len(report.results), details=details)
+            )
+        else:
+            messagebox.showinfo(
+                L10N.get_text("merge_success"),
+                L10N.get_text("merge_success_msg", count=len(report.results)) + "\n" +
+                L10N.get_text("merge_throughput_msg", messages=report.messages, seconds=report.duration, rate=report.throughput)
+            )
         
         # Refresh the view
         self._load_conversations()
 
 if __name__ == "__main__":
+    # merges run in worker processes, which needs this in frozen builds
+    multiprocessing.freeze_support()
     app = ChatLogMerger()
     app.mainloop()
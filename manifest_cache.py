@@ -0,0 +1,143 @@
+import os
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from fchat_logs import get_cache_path
+
+class ManifestCache:
+    """Persistent listing of the characters and conversations of one data folder
+
+    Stores per character the conversation keys and display names together with
+    size and mtime of every log file and stats computed for it. A character is
+    only listed again when the mtime of its logs directory changed, so index
+    headers are read for new conversations only. Safe to use from multiple threads.
+    """
+    def __init__(self, log_directory: str, cache_path: Optional[str] = None):
+        self.log_directory = log_directory
+        if cache_path is None:
+            cache_path = get_cache_path(log_directory, "manifests", ".json")
+        self.cache_path = cache_path
+        self.root_mtime: Optional[float] = None
+        self.characters: Dict[str, Dict[str, Any]] = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                content = json.load(f)
+            self.root_mtime = content["root_mtime"]
+            self.characters = content["characters"]
+        except Exception as e:
+            print(f"Error loading manifest: {e}")
+            self.root_mtime = None
+            self.characters = {}
+
+    def save(self) -> None:
+        """Write the manifest to disk if anything changed"""
+        with self._lock:
+            if not self.dirty:
+                return
+            content = json.dumps({"root_mtime": self.root_mtime, "characters": self.characters})
+            self.dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            temp_path = self.cache_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(temp_path, self.cache_path)
+        except Exception as e:
+            print(f"Error writing manifest: {e}")
+
+    def get_characters(self) -> List[str]:
+        """Get all characters of the data folder, listing it only if it changed"""
+        try:
+            root_mtime = os.stat(self.log_directory).st_mtime
+        except OSError:
+            return []
+        with self._lock:
+            if root_mtime != self.root_mtime:
+                names = {entry.name for entry in os.scandir(self.log_directory) if entry.is_dir()}
+                self.characters = {name: self.characters.get(name, {"dir_mtime": None, "conversations": {}}) for name in names}
+                self.root_mtime = root_mtime
+                self.dirty = True
+            return list(self.characters)
+
+    def get_conversations(self, character: str) -> List[Tuple[str, str]]:
+        """Get key and display name of all conversations of a character"""
+        with self._lock:
+            return [(key, entry["name"]) for key, entry in self._refresh(character).items()]
+
+    def _refresh(self, character: str) -> Dict[str, Dict[str, Any]]:
+        """Re-list the logs directory of a character if it changed since the last call"""
+        dir_path = os.path.join(self.log_directory, character, "logs")
+        try:
+            dir_mtime = os.stat(dir_path).st_mtime
+        except OSError:
+            return {}
+        manifest = self.characters.setdefault(character, {"dir_mtime": None, "conversations": {}})
+        if manifest["dir_mtime"] == dir_mtime:
+            return manifest["conversations"]
+
+        conversations = {}
+        for entry in os.scandir(dir_path):
+            if not entry.name.endswith('.idx'):
+                continue
+            key = entry.name[:-4].lower()
+            cached = manifest["conversations"].get(key)
+            if cached is None:
+                # new conversation, read the display name from the header of its index
+                try:
+                    with open(entry.path, 'rb') as f:
+                        header = f.read(256)
+                except OSError as e:
+                    print(f"Error reading index {entry.path}: {e}")
+                    continue
+                cached = {"name": header[1:header[0] + 1].decode('utf-8') if header else "", "size": None, "mtime": None, "stats": {}}
+            conversations[key] = cached
+        manifest["dir_mtime"] = dir_mtime
+        manifest["conversations"] = conversations
+        self.dirty = True
+        return conversations
+
+    def check_files(self, character: str) -> None:
+        """Stat all log files of a character in one directory pass and drop the stats of changed logs"""
+        dir_path = os.path.join(self.log_directory, character, "logs")
+        with self._lock:
+            conversations = self._refresh(character)
+            try:
+                entries = list(os.scandir(dir_path))
+            except OSError:
+                return
+            for entry in entries:
+                cached = conversations.get(entry.name.lower())
+                if cached is None:
+                    continue
+                stat = entry.stat()
+                if (cached["size"], cached["mtime"]) != (stat.st_size, stat.st_mtime):
+                    cached["size"] = stat.st_size
+                    cached["mtime"] = stat.st_mtime
+                    cached["stats"] = {}
+                    self.dirty = True
+
+    def get_stats(self, character: str, key: str) -> Dict[str, Any]:
+        """Get the stats stored for a conversation, empty if its log changed since"""
+        with self._lock:
+            cached = self.characters.get(character, {}).get("conversations", {}).get(key.lower())
+            return {} if cached is None else dict(cached["stats"])
+
+    def update_stats(self, character: str, key: str, file_size: int, mtime: float, **stats) -> None:
+        """Store stats of a conversation computed from the log with the given size and mtime"""
+        with self._lock:
+            cached = self.characters.get(character, {}).get("conversations", {}).get(key.lower())
+            if cached is None:
+                return
+            if (cached["size"], cached["mtime"]) != (file_size, mtime):
+                cached["size"] = file_size
+                cached["mtime"] = mtime
+                cached["stats"] = {}
+            cached["stats"].update(stats)
+            self.dirty = True
@@ -0,0 +1,104 @@
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+from fchat_logs import ChatLogs, Message, map_log, map_processes
+from search_index import SearchHit
+
+# constructs whose meaning depends on the bytes in front of the text, these can
+# not be pre-filtered on the whole file and are matched record by record instead
+_CONTEXT_SENSITIVE = re.compile(rb"[\^$]|\\[AZbB]|\(\?<[=!]")
+
+@dataclass
+class RawSearchReport:
+    hits: List[SearchHit] = field(default_factory=list)
+    files: int = 0
+    duration: float = 0.0
+
+def compile_pattern(pattern: str, regex: bool = False, ignore_case: bool = True) -> "re.Pattern[bytes]":
+    """Compile a search string to a byte pattern matching the UTF-8 encoded message text
+
+    Case folding of byte patterns only covers ASCII letters.
+    """
+    source = pattern.encode('utf-8')
+    if not regex:
+        source = re.escape(source)
+    return re.compile(source, re.IGNORECASE if ignore_case else 0)
+
+def _search_log(log_directory: str, account: str, key: str, pattern: bytes, flags: int, limit: int) -> List[Tuple[int, Message]]:
+    """Find the records of one log whose text matches, runs inside a worker process"""
+    db = ChatLogs(log_directory)
+    compiled = re.compile(pattern, flags)
+    per_record = _CONTEXT_SENSITIVE.search(pattern) is not None
+    hits: List[Tuple[int, Message]] = []
+
+    with map_log(db.get_log_file(account, key)) as buffer:
+        if not per_record and compiled.search(buffer) is None:
+            return hits
+
+        next_match = -1
+        records = db.iter_records(account, key)
+        try:
+            for record in records:
+                if not per_record:
+                    # skip ahead to the record containing the next match in the raw bytes
+                    if next_match < record.offset:
+                        match = compiled.search(buffer, record.offset)
+                        if match is None:
+                            break
+                        next_match = match.start()
+                    if next_match >= record.end:
+                        continue
+                # the raw match may have started in the header, confirm it on the text alone
+                if compiled.search(record.text_bytes) is not None:
+                    hits.append((record.offset, record.to_message(db.senders)))
+                    if len(hits) >= limit:
+                        break
+        except ValueError as e:
+            print(f"Stopped searching {account}/{key}: {e}")
+        finally:
+            records.close()
+    return hits
+
+def search_logs(log_directory: str, pattern: str, regex: bool = False, ignore_case: bool = True,
+                accounts: Optional[List[str]] = None, limit: int = 1000, max_workers: Optional[int] = None,
+                progress: Optional[Callable[[List[SearchHit], int, int], None]] = None) -> RawSearchReport:
+    """Search the raw bytes of all logs of a data folder in parallel on a process pool
+
+    Only matching messages are decoded.
+
+    Args:
+        pattern: Substring or, with regex=True, regular expression to find
+        accounts: Characters to search, defaults to all
+        limit: Maximum number of hits per log and in total
+        max_workers: Number of worker processes, defaults to the number of CPUs
+        progress: Called with (hits of the log, done, total) after every searched log
+    """
+    db = ChatLogs(log_directory)
+    compiled = compile_pattern(pattern, regex, ignore_case)
+    logs = [
+        (account, key, name)
+        for account in (accounts or db.get_available_characters())
+        for key, name in db.get_conversations(account)
+    ]
+    report = RawSearchReport(files=len(logs))
+    start = time.perf_counter()
+
+    jobs = [(log_directory, account, key, compiled.pattern, compiled.flags, limit) for account, key, _ in logs]
+    names = {(account, key): name for account, key, name in logs}
+    for done, (job, result) in enumerate(map_processes(_search_log, jobs, max_workers), 1):
+        account, key = job[1], job[2]
+        try:
+            hits = result()
+        except Exception as e:
+            print(f"Error searching {account}/{key}: {e}")
+            hits = []
+        found = [SearchHit(account, (key, names[account, key]), offset, message) for offset, message in hits]
+        report.hits.extend(found)
+        if progress is not None:
+            progress(found, done, len(logs))
+
+    report.hits.sort(key=lambda hit: (hit.account, hit.conversation[0], hit.offset))
+    del report.hits[limit:]
+    report.duration = time.perf_counter() - start
+    return report
@@ -0,0 +1,235 @@
+import os
+import re
+import mmap
+import zlib
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from fchat_logs import ChatLogs, Message, get_cache_path, is_prefix_intact
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lower-case word tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+@dataclass
+class SearchHit:
+    account: str
+    conversation: Tuple[str, str]  # key and name
+    offset: int                    # file offset of the message
+    message: Message
+
+class SearchIndex:
+    """Persistent inverted index over all conversation logs of a data folder
+
+    Every token of a message is stored with the conversation, timestamp and file
+    offset of the message. Logs that only grew since the last update are indexed from
+    their previous end on.
+    """
+    def __init__(self, log_directory: str, index_path: Optional[str] = None):
+        self.chat_logs = ChatLogs(log_directory)
+        if index_path is None:
+            index_path = get_cache_path(log_directory, "search", ".sqlite")
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self.connection = sqlite3.connect(index_path)
+        self.tokens: Dict[str, int] = {}
+        self._create_tables()
+
+    def _create_tables(self) -> None:
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                id INTEGER PRIMARY KEY,
+                account TEXT NOT NULL,
+                key TEXT NOT NULL,
+                name TEXT NOT NULL,
+                indexed_size INTEGER NOT NULL DEFAULT 0,
+                last_offset INTEGER,
+                last_timestamp INTEGER,
+                last_crc INTEGER,
+                UNIQUE (account, key)
+            );
+            CREATE TABLE IF NOT EXISTS tokens (
+                id INTEGER PRIMARY KEY,
+                token TEXT NOT NULL UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                token_id INTEGER NOT NULL,
+                conversation_id INTEGER NOT NULL,
+                timestamp INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                PRIMARY KEY (token_id, conversation_id, offset)
+            ) WITHOUT ROWID;
+            -- postings of a rewritten or deleted log are removed by conversation
+            CREATE INDEX IF NOT EXISTS postings_conversation ON postings (conversation_id);
+        """)
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def update(self, accounts: Optional[Iterable[str]] = None) -> int:
+        """Index everything that was added to the logs since the last update
+
+        Returns:
+            Number of newly indexed messages
+        """
+        count = 0
+        all_accounts = not accounts
+        accounts = self.chat_logs.get_available_characters() if all_accounts else list(accounts)
+        present = set()
+        for account in accounts:
+            for key, name in self.chat_logs.get_conversations(account):
+                present.add((account, key))
+                count += self._update_conversation(account, key, name)
+        self._remove_deleted(None if all_accounts else accounts, present)
+        return count
+
+    def _remove_deleted(self, accounts: Optional[List[str]], present: Set[Tuple[str, str]]) -> None:
+        """Drop the conversations of the given accounts (or all) whose logs no longer exist"""
+        rows = self.connection.execute("SELECT id, account, key FROM conversations").fetchall()
+        deleted = [
+            (conversation_id,) for conversation_id, account, key in rows
+            if (accounts is None or account in accounts) and (account, key) not in present
+        ]
+        if not deleted:
+            return
+        self.connection.executemany("DELETE FROM postings WHERE conversation_id = ?", deleted)
+        self.connection.executemany("DELETE FROM conversations WHERE id = ?", deleted)
+        self.connection.commit()
+
+    def _update_conversation(self, account: str, key: str, name: str) -> int:
+        file_path = self.chat_logs.get_log_file(account, key)
+        size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        row = self.connection.execute(
+            "SELECT id, indexed_size, last_offset, last_crc FROM conversations WHERE account = ? AND key = ?",
+            (account, key)
+        ).fetchone()
+        if row is None:
+            conversation_id = self.connection.execute(
+                "INSERT INTO conversations (account, key, name) VALUES (?, ?, ?)", (account, key, name)
+            ).lastrowid
+            start = 0
+        else:
+            conversation_id, start, last_offset, last_crc = row
+            if start == size:
+                return 0
+            if start > size or not is_prefix_intact(file_path, last_offset, last_crc, start):
+                # the log was rewritten (e.g. by a merge), index it from scratch
+                self.connection.execute("DELETE FROM postings WHERE conversation_id = ?", (conversation_id,))
+                start = 0
+
+        postings = []
+        count = 0
+        last = None
+        try:
+            for record in self.chat_logs.iter_records(account, key, start_offset=start):
+                for token in set(tokenize(record.text)):
+                    postings.append((self._get_token_id(token), conversation_id, record.timestamp, record.offset))
+                count += 1
+                last = record
+        except ValueError as e:
+            # F-Chat may still be writing the last message, it is indexed next time
+            print(f"Stopped indexing {account}/{key}: {e}")
+
+        self.connection.executemany("INSERT OR IGNORE INTO postings VALUES (?, ?, ?, ?)", postings)
+        if last is not None:
+            self.connection.execute(
+                "UPDATE conversations SET name = ?, indexed_size = ?, last_offset = ?, last_timestamp = ?, last_crc = ? WHERE id = ?",
+                (name, last.end, last.offset, last.timestamp, zlib.crc32(last.raw), conversation_id)
+            )
+        elif start == 0:
+            self.connection.execute(
+                "UPDATE conversations SET name = ?, indexed_size = 0, last_offset = NULL, last_timestamp = NULL, last_crc = NULL WHERE id = ?",
+                (name, conversation_id)
+            )
+        self.connection.commit()
+        return count
+
+    def _get_token_id(self, token: str) -> int:
+        token_id = self.tokens.get(token)
+        if token_id is None:
+            row = self.connection.execute("SELECT id FROM tokens WHERE token = ?", (token,)).fetchone()
+            if row is None:
+                token_id = self.connection.execute("INSERT INTO tokens (token) VALUES (?)", (token,)).lastrowid
+            else:
+                token_id = row[0]
+            self.tokens[token] = token_id
+        return token_id
+
+    def search(self, query: str, account: Optional[str] = None, sender: Optional[str] = None,
+               date_from: Optional[datetime] = None, date_to: Optional[datetime] = None, limit: int = 100) -> List[SearchHit]:
+        """Find messages containing all words of the query
+
+        A query wrapped in double quotes only matches the exact phrase.
+
+        Args:
+            account: Only search the conversations of this character
+            sender: Only return messages of this sender (case-insensitive)
+            date_from: Only return messages on or after this day
+            date_to: Only return messages on or before this day
+            limit: Maximum number of hits
+        """
+        phrase = query.strip()
+        is_phrase = len(phrase) > 1 and phrase.startswith('"') and phrase.endswith('"')
+        tokens = sorted(set(tokenize(phrase)))
+        if not tokens:
+            return []
+
+        # candidates are all messages that contain every token
+        conditions = []
+        parameters: list = []
+        for token in tokens:
+            conditions.append("SELECT p.conversation_id, p.offset FROM postings p JOIN tokens t ON t.id = p.token_id WHERE t.token = ?")
+            parameters.append(token)
+            if date_from is not None:
+                conditions[-1] += " AND p.timestamp >= ?"
+                parameters.append(int(self._start_of_day(date_from).timestamp()))
+            if date_to is not None:
+                conditions[-1] += " AND p.timestamp < ?"
+                parameters.append(int((self._start_of_day(date_to) + timedelta(days=1)).timestamp()))
+        sql = (
+            "SELECT c.account, c.key, c.name, m.offset FROM (" + " INTERSECT ".join(conditions) + ") m "
+            "JOIN conversations c ON c.id = m.conversation_id"
+        )
+        if account is not None:
+            sql += " WHERE c.account = ?"
+            parameters.append(account)
+        sql += " ORDER BY c.account, c.key, m.offset"
+
+        # group by conversation so every log is only mapped once
+        candidates: Dict[Tuple[str, str, str], List[int]] = {}
+        for hit_account, key, name, offset in self.connection.execute(sql, parameters):
+            candidates.setdefault((hit_account, key, name), []).append(offset)
+
+        normalized_phrase = " ".join(tokenize(phrase))
+        hits = []
+        for (hit_account, key, name), offsets in candidates.items():
+            for offset, message in self._read_messages(hit_account, key, offsets):
+                if sender is not None and message.sender.name.lower() != sender.lower():
+                    continue
+                # padded with spaces, so the phrase only matches whole words
+                if is_phrase and f" {normalized_phrase} " not in f" {' '.join(tokenize(message.text))} ":
+                    continue
+                hits.append(SearchHit(hit_account, (key, name), offset, message))
+                if len(hits) >= limit:
+                    return hits
+        return hits
+
+    def _start_of_day(self, time: datetime) -> datetime:
+        """Midnight of the day of time, in its timezone"""
+        return time.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def _read_messages(self, account: str, key: str, offsets: List[int]) -> Iterable[Tuple[int, Message]]:
+        """Decode the messages at the given offsets of a log"""
+        file_path = self.chat_logs.get_log_file(account, key)
+        if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+            return
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for offset in offsets:
+                try:
+                    yield offset, self.chat_logs.deserialize_message(buffer, offset)[0]
+                except Exception as e:
+                    # the index is outdated, the next update fixes it
+                    print(f"Error reading search hit {account}/{key}@{offset}: {e}")
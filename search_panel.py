@@ -0,0 +1,166 @@
+import queue
+import threading
+import tkinter as tk
+from tkinter import ttk
+import ttkbootstrap as ttk
+from typing import Dict
+from raw_search import search_logs
+from localization import L10N
+
+# hits shown at most, the search stops collecting after this many
+MAX_HITS = 1000
+
+class SearchPanel(ttk.Toplevel):
+    def __init__(self, parent, databases: Dict[str, str], account: str):
+        super().__init__(parent)
+        self.title(L10N.get_text("search_title", account=account))
+        self.geometry("1000x600")
+
+        # database label -> data folder
+        self.databases = databases
+        self.account = account
+        self.search_thread = None
+        self.search_id = 0
+
+        self._create_ui()
+
+    def _create_ui(self):
+        """Create the search UI"""
+        main_container = ttk.Frame(self, padding=10)
+        main_container.pack(fill=tk.BOTH, expand=True)
+
+        # Query and options at top
+        query_frame = ttk.Frame(main_container)
+        query_frame.pack(fill=tk.X, pady=(0, 10))
+
+        self.database_combo = ttk.Combobox(query_frame, state="readonly", values=list(self.databases), width=15)
+        self.database_combo.set(next(iter(self.databases)))
+        self.database_combo.pack(side=tk.LEFT)
+
+        self.query_entry = ttk.Entry(query_frame)
+        self.query_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.query_entry.bind("<Return>", lambda e: self._start_search())
+        self.query_entry.focus_set()
+
+        self.regex_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            query_frame,
+            text=L10N.get_text("search_regex"),
+            variable=self.regex_var
+        ).pack(side=tk.LEFT, padx=5)
+
+        self.case_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            query_frame,
+            text=L10N.get_text("search_case_sensitive"),
+            variable=self.case_var
+        ).pack(side=tk.LEFT, padx=5)
+
+        self.search_btn = ttk.Button(
+            query_frame,
+            text=L10N.get_text("search_button"),
+            command=self._start_search,
+            style="info.TButton"
+        )
+        self.search_btn.pack(side=tk.LEFT, padx=(5, 0))
+
+        # Results
+        results_frame = ttk.Frame(main_container)
+        results_frame.pack(fill=tk.BOTH, expand=True)
+
+        self.results = ttk.Treeview(
+            results_frame,
+            columns=("time", "conversation", "sender", "text"),
+            show="headings"
+        )
+        self.results.column("time", width=140, stretch=False)
+        self.results.column("conversation", width=150, stretch=False)
+        self.results.column("sender", width=120, stretch=False)
+        self.results.column("text", width=500)
+        self.results.heading("time", text=L10N.get_text("search_time_column"))
+        self.results.heading("conversation", text=L10N.get_text("conversation_column"))
+        self.results.heading("sender", text=L10N.get_text("search_sender_column"))
+        self.results.heading("text", text=L10N.get_text("search_text_column"))
+
+        scrollbar = ttk.Scrollbar(results_frame, orient=tk.VERTICAL, command=self.results.yview)
+        self.results.configure(yscrollcommand=scrollbar.set)
+        self.results.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        # Progress
+        status_frame = ttk.Frame(main_container)
+        status_frame.pack(fill=tk.X, pady=(10, 0))
+        self.status_label = ttk.Label(status_frame, text="")
+        self.status_label.pack(side=tk.LEFT)
+        self.progress = ttk.Progressbar(status_frame, mode="determinate", length=150)
+        self.progress.pack(side=tk.RIGHT)
+
+    def _start_search(self):
+        """Search the selected database in the background"""
+        query = self.query_entry.get()
+        if not query or (self.search_thread is not None and self.search_thread.is_alive()):
+            return
+
+        self.results.delete(*self.results.get_children())
+        self.search_id += 1
+        updates = queue.Queue()
+        self.search_thread = threading.Thread(
+            target=self._run_search,
+            args=(self.databases[self.database_combo.get()], query, self.regex_var.get(), not self.case_var.get(), updates),
+            daemon=True
+        )
+        self.search_thread.start()
+        self.after(100, self._poll_search, self.search_id, updates)
+
+    def _run_search(self, path, query, regex, ignore_case, updates):
+        """Run the search, called on the search thread"""
+        try:
+            report = search_logs(
+                path, query, regex, ignore_case,
+                accounts=[self.account],
+                limit=MAX_HITS,
+                progress=lambda hits, done, total: updates.put((hits, done, total))
+            )
+        except Exception as e:
+            report = e
+        updates.put(report)
+
+    def _poll_search(self, search_id, updates):
+        """Show hits as they arrive and the final summary"""
+        if search_id != self.search_id or not self.winfo_exists():
+            return
+
+        report = None
+        while True:
+            try:
+                update = updates.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(update, tuple):
+                hits, done, total = update
+                for hit in hits:
+                    if len(self.results.get_children()) >= MAX_HITS:
+                        break
+                    self.results.insert(
+                        "",
+                        "end",
+                        values=(
+                            hit.message.time.strftime("%Y-%m-%d %H:%M:%S"),
+                            hit.conversation[1],
+                            hit.message.sender.name,
+                            hit.message.text.replace("\n", " ")
+                        )
+                    )
+                self.status_label.configure(text=L10N.get_text("search_progress", done=done, total=total))
+                self.progress.configure(maximum=max(total, 1), value=done)
+            else:
+                report = update
+
+        if report is None:
+            self.after(100, self._poll_search, search_id, updates)
+        elif isinstance(report, Exception):
+            self.status_label.configure(text=L10N.get_text("search_failed_msg", error=str(report)))
+        else:
+            self.status_label.configure(text=L10N.get_text(
+                "search_done_msg", hits=len(report.hits), files=report.files, seconds=report.duration
+            ))
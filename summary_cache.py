@@ -0,0 +1,113 @@
+import os
+import json
+import zlib
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional
+from fchat_logs import ChatLogs, is_prefix_intact
+
+@dataclass
+class ConversationSummary:
+    """Cached statistics of a single conversation log"""
+    file_size: int            # size of the log file when it was scanned
+    mtime: float              # modification time of the log file when it was scanned
+    scanned_size: int         # end of the last complete message
+    count: int = 0
+    first_timestamp: Optional[int] = None
+    last_timestamp: Optional[int] = None
+    last_offset: Optional[int] = None  # file offset of the last message
+    last_crc: Optional[int] = None     # crc32 of the last message, to detect a rewritten prefix
+    fingerprint: int = 0      # crc32 over all scanned bytes
+
+class SummaryCache:
+    """Persistent cache of conversation summaries keyed by log path, size and mtime
+
+    When a log only grew since it was cached, just the new tail bytes are scanned.
+    Safe to use from multiple threads.
+    """
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+        self.summaries: Dict[str, ConversationSummary] = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                self.summaries = {path: ConversationSummary(**values) for path, values in json.load(f).items()}
+        except Exception as e:
+            print(f"Error loading summary cache: {e}")
+            self.summaries = {}
+
+    def save(self) -> None:
+        """Write the cache to disk if anything changed"""
+        with self._lock:
+            if not self.dirty:
+                return
+            content = {path: asdict(summary) for path, summary in self.summaries.items()}
+            self.dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            temp_path = self.cache_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(content, f)
+            os.replace(temp_path, self.cache_path)
+        except Exception as e:
+            print(f"Error writing summary cache: {e}")
+
+    def get(self, db: ChatLogs, character: str, conversation_key: str) -> Optional[ConversationSummary]:
+        """Get the summary of a conversation, scanning only what changed since the last call
+
+        Returns:
+            The summary or None if the conversation has no log file
+        """
+        file_path = os.path.abspath(db.get_log_file(character, conversation_key))
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            with self._lock:
+                if self.summaries.pop(file_path, None) is not None:
+                    self.dirty = True
+            return None
+
+        with self._lock:
+            cached = self.summaries.get(file_path)
+        if cached is not None and cached.file_size == stat.st_size and cached.mtime == stat.st_mtime:
+            return cached
+
+        if cached is not None and cached.scanned_size <= stat.st_size and is_prefix_intact(file_path, cached.last_offset, cached.last_crc, cached.scanned_size):
+            summary = ConversationSummary(**asdict(cached))
+        else:
+            summary = ConversationSummary(file_size=0, mtime=0, scanned_size=0)
+
+        summary.file_size = stat.st_size
+        summary.mtime = stat.st_mtime
+        self._scan(db, character, conversation_key, summary)
+        with self._lock:
+            self.summaries[file_path] = summary
+            self.dirty = True
+        return summary
+
+    def _scan(self, db: ChatLogs, character: str, conversation_key: str, summary: ConversationSummary) -> None:
+        """Add all messages after summary.scanned_size to the summary"""
+        start = summary.scanned_size
+        last = None
+        try:
+            for record in db.iter_records(character, conversation_key, start_offset=start):
+                if summary.first_timestamp is None:
+                    summary.first_timestamp = record.timestamp
+                summary.count += 1
+                last = record
+        except ValueError as e:
+            # F-Chat may still be writing the last message, it is picked up next time
+            print(f"Stopped summarizing {character}/{conversation_key}: {e}")
+
+        if last is not None:
+            summary.last_timestamp = last.timestamp
+            summary.last_offset = last.offset
+            summary.last_crc = zlib.crc32(last.raw)
+            summary.scanned_size = last.end
+            summary.fingerprint = zlib.crc32(last.buffer[start:last.end], summary.fingerprint)
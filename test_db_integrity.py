@@ -1,5 +1,6 @@
 import os
 from fchat_logs import ChatLogs
+from bulk_decode import HAS_NUMPY, decode_log
 from typing import Tuple, Optional
 import shutil
 import argparse
@@ -64,22 +65,18 @@ def test_database_integrity(source_db_path: str, test_account: str, test_convers
         return
 
     conversation_name = index[test_conversation].name
-    # Read all messages from source
-    messages = source_db.get_backlog(test_account, test_conversation)
-    if not messages:
-        print(f"No messages found for {test_account}/{test_conversation}")
-        return
-        
-    print(f"Read {len(messages)} messages from source database")
-    
-    # Create fresh test database
+    # Stream all messages from source into a fresh test database
     shutil.rmtree(test_db_path)
     os.makedirs(test_db_path)
     test_db = ChatLogs(test_db_path)
-    
-    # Write messages to test database
-    for msg in messages:
-        test_db.log_message(test_account, [test_conversation, conversation_name], msg)
+
+    with test_db.open_writer(test_account, [test_conversation, conversation_name]) as writer:
+        count = writer.write_all(source_db.iter_backlog(test_account, test_conversation))
+    if count == 0:
+        print(f"No messages found for {test_account}/{test_conversation}")
+        return
+
+    print(f"Read {count} messages from source database")
 
     # Compare log files
     source_log = source_db.get_log_file(test_account, test_conversation)
@@ -109,12 +106,28 @@ def test_database_integrity(source_db_path: str, test_account: str, test_convers
     else:
         print("Index files are identical! 🎉")
 
+def test_bulk_decoder(source_db_path: str, test_account: str, test_conversation: str) -> None:
+    """Check that the NumPy bulk decoder reads the same messages as deserialize_message"""
+    if not HAS_NUMPY:
+        print("NumPy is not installed, skipping bulk decoder test")
+        return
+
+    source_db = ChatLogs(source_db_path)
+    print("\nComparing bulk decoder...")
+    try:
+        with decode_log(source_db, test_account, test_conversation) as log:
+            log.verify(source_db)
+            print(f"Bulk decoder matches for all {len(log)} messages! 🎉")
+    except ValueError as e:
+        print(f"Bulk decoder differs: {e}")
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="F-Chat Database Inspector ")
     parser.add_argument('-s', '--source', help='Source-Path')
     parser.add_argument('-a', '--account', help='Account to get Logfiles for')
     parser.add_argument('-c', '--conversation', help='Conversation to get Logfiles for')
+    parser.add_argument('--bulk', action='store_true', help='Also verify the NumPy bulk decoder')
     
     args = parser.parse_args()
     
@@ -130,3 +143,6 @@ if __name__ == "__main__":
         args.account,  # Replace with actual account
         args.conversation  # Replace with actual conversation key
     )
+
+    if args.bulk:
+        test_bulk_decoder(args.source, args.account, args.conversation)